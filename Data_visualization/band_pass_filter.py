@@ -1,10 +1,99 @@
 import numpy as np
-from scipy.signal import butter, sosfiltfilt
+from scipy.signal import sosfiltfilt, sosfilt, group_delay
 import logging
 import matplotlib.pyplot as plt
 import os
 
-def band_pass(database_name, sensor_data, low_cutoff, high_cutoff, fs_mmg, fs_imu, filter_order=10):
+from daq_processing import MMG_CHANNELS, DAQ_RECORD_DTYPE, iter_daq_blocks
+from filter_design import design_sos, design_sos_zi
+
+def mmg_channel_matrix(sensor_data):
+    """
+    Stacks the six MMG signals used for blink detection into one contiguous array:
+    the RMS of A5 to A7 (accelerometer XYZ) as the new A0, followed by A0 to A4.
+
+    Args:
+        sensor_data (dict): Dictionary containing all sensor data of one DAQ.
+
+    Returns:
+        np.ndarray: Array of shape (6, N), float32 if the channels are float32 and float64 otherwise.
+    """
+    aclm_x = np.asarray(sensor_data["A5"])
+    aclm_y = np.asarray(sensor_data["A6"])
+    aclm_z = np.asarray(sensor_data["A7"])
+
+    mmg_sensor_data = np.empty((6, len(aclm_x)), dtype=np.result_type(aclm_x, np.float32))
+    mmg_sensor_data[0] = np.sqrt((aclm_x**2 + aclm_y**2 + aclm_z**2) / 3)
+    for i in range(5):
+        mmg_sensor_data[i + 1] = sensor_data[f"A{i}"]
+    return mmg_sensor_data
+
+
+def band_pass_mmg_batch(sensor_data_list, low_cutoff, high_cutoff, fs_mmg, filter_order=10):
+    """
+    Applies the MMG bandpass filter to every DAQ at once. The channels of all DAQs with the same
+    length are stacked into one contiguous (channels, N) array and filtered with a single
+    sosfiltfilt call, so aligned DAQs are filtered in one pass. No figures are produced.
+
+    Args:
+        sensor_data_list (list): Sensor data dictionaries, one per DAQ.
+        low_cutoff (float): Low cutoff frequency for the bandpass filter.
+        high_cutoff (float): High cutoff frequency for the bandpass filter.
+        fs_mmg (int): Sampling frequency for MMG sensor data.
+        filter_order (int): Order of the filter (default is 10).
+
+    Returns:
+        list: One filtered array of shape (6, N) per DAQ, in the order of mmg_channel_matrix
+              and in the float type of the sensor data.
+    """
+    sos_mmg = design_sos(filter_order // 2, [low_cutoff, high_cutoff], fs_mmg)
+    mmg_matrices = [mmg_channel_matrix(sensor_data) for sensor_data in sensor_data_list]
+
+    # Group DAQs by length so each group is a single 2-D filter call
+    groups = {}
+    for i, mmg_sensor_data in enumerate(mmg_matrices):
+        groups.setdefault(mmg_sensor_data.shape[1], []).append(i)
+
+    filtered_mmg_list = [None] * len(mmg_matrices)
+    for daq_indices in groups.values():
+        stacked = np.concatenate([mmg_matrices[i] for i in daq_indices], axis=0)
+        # sosfiltfilt computes in the common type of the coefficients and the data
+        filtered = sosfiltfilt(sos_mmg.astype(stacked.dtype), stacked, axis=-1)
+        for k, i in enumerate(daq_indices):
+            filtered_mmg_list[i] = filtered[6 * k:6 * (k + 1)]
+
+    logging.info(f"Bandpass filtering for MMG sensors completed for {len(mmg_matrices)} DAQs in {len(groups)} batch(es)")
+    return filtered_mmg_list
+
+
+def plot_filtered_mmg(database_name, filtered_mmg_data, fs_mmg):
+    """
+    Saves one figure per filtered MMG sensor to ./visual.
+
+    Args:
+        database_name (str): Name of the database for saving visualizations.
+        filtered_mmg_data (np.ndarray): Filtered MMG sensor data, shape (6, N).
+        fs_mmg (int): Sampling frequency for MMG sensor data.
+    """
+    os.makedirs('visual', exist_ok=True)
+
+    # Visualize MMG sensors (recalculate time vector based on filtered data length)
+    for i, filtered_data in enumerate(filtered_mmg_data):
+        time_vector_mmg = np.arange(len(filtered_data)) / fs_mmg  # Ensure the time vector matches filtered data length
+        plt.figure(figsize=(10, 4))
+        plt.plot(time_vector_mmg, filtered_data, label=f'MMG Sensor A{i}')
+        plt.title(f'Filtered MMG Sensor A{i} Data')
+        plt.xlabel('Time (s)')
+        plt.ylabel('Sensor Output (a.u.)')
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(f'./visual/{database_name}_MMG_A{i}_filtered.png', dpi=300)
+        plt.close()
+
+    logging.info(f"MMG sensor data visualization saved for {database_name}")
+
+def band_pass(database_name, sensor_data, low_cutoff, high_cutoff, fs_mmg, fs_imu, filter_order=10, render=True):
     """
     Apply a bandpass filter to MMG and IMU sensor data arrays separately and visualize the results.
     
@@ -17,64 +106,42 @@ def band_pass(database_name, sensor_data, low_cutoff, high_cutoff, fs_mmg, fs_im
         fs_mmg (int): Sampling frequency for MMG sensor data.
         fs_imu (int): Sampling frequency for IMU sensor data.
         filter_order (int): Order of the filter (default is 10).
+        render (bool): Whether to save the figures (see plot_filtered_mmg). Pipelines pass False and render separately.
         
     Returns:
-        filtered_mmg_data (list): List of filtered MMG sensor data arrays.
-        filtered_imu_data (list): List of filtered IMU sensor data arrays (if IMU data exists).
+        filtered_mmg_data (np.ndarray): Filtered MMG sensor data, shape (6, N).
+        filtered_imu_data (np.ndarray): Filtered IMU sensor data, shape (9, N_imu), or an empty list if there is no IMU data.
     """
     try:
         logging.info(f"Applying bandpass filter to MMG and IMU sensors for {database_name}")
 
-        # ===================== Compute RMS of A5 to A7 (accelerometer XYZ) =====================
-        aclm_x = sensor_data["A5"]
-        aclm_y = sensor_data["A6"]
-        aclm_z = sensor_data["A7"]
-        
-        # Compute RMS for A5, A6, A7 (treated as the same accelerometer)
-        A5_rms = np.sqrt((aclm_x**2 + aclm_y**2 + aclm_z**2) / 3)
-
-        # Use this new RMS signal as the new A0 sensor
-        mmg_sensor_data_list = [A5_rms]  # Start the list with the RMS of A5 to A7
-
-        # Add the remaining MMG sensors (A3 to A7)
-        mmg_sensor_data_list.extend([sensor_data[f"A{i}"] for i in range(5)])  # A0 to A4
+        # ===================== MMG Sensor Data =====================
+        # RMS of A5 to A7 (accelerometer XYZ) as the new A0, followed by A0 to A4
+        mmg_sensor_data = mmg_channel_matrix(sensor_data)
 
         # ===================== IMU Sensor Data =====================
         imu_sensor_data_list = [sensor_data.get(key) for key in ["Aclm_X", "Aclm_Y", "Aclm_Z", "Gyro_X", "Gyro_Y", "Gyro_Z", "Mag_X", "Mag_Y", "Mag_Z"]]
         imu_sensor_data_list = [data for data in imu_sensor_data_list if data is not None and len(data) > 0]  # Filter out any missing or empty IMU data
 
         # ===================== Filter for MMG sensors =====================
-        sos_mmg = butter(filter_order // 2, [low_cutoff, high_cutoff], btype='bandpass', fs=fs_mmg, output='sos')
-        filtered_mmg_data = [sosfiltfilt(sos_mmg, sensor_data) for sensor_data in mmg_sensor_data_list]
+        sos_mmg = design_sos(filter_order // 2, [low_cutoff, high_cutoff], fs_mmg)
+        filtered_mmg_data = sosfiltfilt(sos_mmg.astype(mmg_sensor_data.dtype), mmg_sensor_data, axis=-1)
         logging.info(f"Bandpass filtering for MMG sensors completed for {database_name}")
 
         # ===================== Filter for IMU sensors (if available) =====================
         filtered_imu_data = []
         if imu_sensor_data_list:  # Check if IMU data exists
-            sos_imu = butter(filter_order // 2, [low_cutoff, high_cutoff], btype='bandpass', fs=fs_imu, output='sos')
-            filtered_imu_data = [sosfiltfilt(sos_imu, sensor_data) for sensor_data in imu_sensor_data_list]
+            sos_imu = design_sos(filter_order // 2, [low_cutoff, high_cutoff], fs_imu)
+            imu_len = min(len(data) for data in imu_sensor_data_list)
+            imu_sensor_data = np.vstack([np.asarray(data)[:imu_len] for data in imu_sensor_data_list])
+            filtered_imu_data = sosfiltfilt(sos_imu.astype(np.result_type(imu_sensor_data, np.float32)), imu_sensor_data, axis=-1)
             logging.info(f"Bandpass filtering for IMU sensors completed for {database_name}")
         else:
             logging.info(f"No IMU data found for {database_name}, skipping IMU filtering.")
 
         # ===================== Visualization of Filtered Data =====================
-        os.makedirs('visual', exist_ok=True)
-
-        # Visualize MMG sensors (recalculate time vector based on filtered data length)
-        for i, filtered_data in enumerate(filtered_mmg_data):
-            time_vector_mmg = np.arange(len(filtered_data)) / fs_mmg  # Ensure the time vector matches filtered data length
-            plt.figure(figsize=(10, 4))
-            plt.plot(time_vector_mmg, filtered_data, label=f'MMG Sensor A{i}')
-            plt.title(f'Filtered MMG Sensor A{i} Data')
-            plt.xlabel('Time (s)')
-            plt.ylabel('Sensor Output (a.u.)')
-            plt.legend()
-            plt.grid(True)
-            plt.tight_layout()
-            plt.savefig(f'./visual/{database_name}_MMG_A{i}_filtered.png', dpi=300)
-            plt.clf()
-
-        logging.info(f"MMG sensor data visualization saved for {database_name}")
+        if render:
+            plot_filtered_mmg(database_name, filtered_mmg_data, fs_mmg)
 
         # # Visualize IMU sensors (if available)
         # if filtered_imu_data:
@@ -100,3 +167,194 @@ def band_pass(database_name, sensor_data, low_cutoff, high_cutoff, fs_mmg, fs_im
     except Exception as e:
         logging.error(f"Error during bandpass filtering or visualization for {database_name}: {e}")
         raise
+
+
+class StreamingBandPass:
+    """
+    Causal bandpass filter for live data. Keeps the sosfilt state of every channel between calls,
+    so a recording fed in chunks of any size gives the same output as filtering it in one piece.
+
+    Unlike band_pass (zero-phase sosfiltfilt), the output lags the input, and as for any Butterworth
+    IIR the lag depends on frequency: for the 1-30 Hz filter at 256 Hz it is about 216 samples at
+    1 Hz, 42 at 2 Hz, 10 at 5 Hz, 6 at 10-20 Hz and 8 at 28 Hz. There is no single fixed delay;
+    group_delay is the delay averaged over the passband and max_group_delay the worst case over it,
+    so detectors can shift their windows by the former and widen them by the difference.
+    group_delay_at gives the delay in any band of interest.
+
+    Args:
+        low_cutoff (float): Low cutoff frequency for the bandpass filter.
+        high_cutoff (float): High cutoff frequency for the bandpass filter.
+        fs (int): Sampling frequency of the streamed data.
+        n_channels (int): Number of channels per chunk.
+        filter_order (int): Order of the filter (default is 10).
+    """
+
+    def __init__(self, low_cutoff, high_cutoff, fs, n_channels, filter_order=10):
+        self.fs = fs
+        self.n_channels = n_channels
+        self.sos = design_sos(filter_order // 2, [low_cutoff, high_cutoff], fs)
+        self._zi_unit = design_sos_zi(filter_order // 2, [low_cutoff, high_cutoff], fs)
+        passband_delay = self.group_delay_at(np.linspace(low_cutoff, high_cutoff, 256))
+        self.group_delay_samples = float(passband_delay.mean())
+        self.max_group_delay_samples = float(passband_delay.max())
+        self.group_delay = self.group_delay_samples / fs
+        self.max_group_delay = self.max_group_delay_samples / fs
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets the filter state; the next chunk starts a new stream.
+        """
+        self._zi = None
+        self.samples_processed = 0
+
+    def group_delay_at(self, frequencies):
+        """
+        Group delay of the filter in samples at the given frequencies (Hz).
+        """
+        frequencies = np.atleast_1d(np.asarray(frequencies, dtype=float))
+        delay = np.zeros_like(frequencies)
+        for section in self.sos:
+            # Delay of a cascade is the sum of the delays of its sections
+            _, section_delay = group_delay((section[:3], section[3:]), w=frequencies, fs=self.fs)
+            delay += section_delay
+        return delay if delay.size > 1 else delay[0]
+
+    def process(self, chunk):
+        """
+        Filters the next chunk of samples.
+
+        Args:
+            chunk (np.ndarray): Array of shape (n_channels, n) with any n >= 0, or shape (n,) for one channel.
+
+        Returns:
+            np.ndarray: Filtered chunk of the same shape, delayed by group_delay_at the signal frequencies.
+        """
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.ndim == 2 and chunk.shape[0] == self.n_channels:
+            data = chunk
+        elif chunk.ndim == 1 and self.n_channels == 1:
+            data = chunk[None, :]
+        else:
+            raise ValueError(f"Expected a chunk of shape ({self.n_channels}, n){' or (n,)' if self.n_channels == 1 else ''}, got {chunk.shape}")
+        if data.shape[1] == 0:
+            return chunk.copy()
+
+        if self._zi is None:
+            # Start in steady state at the first sample to avoid a start-up transient
+            self._zi = self._zi_unit[:, None, :] * data[None, :, 0, None]
+
+        filtered, self._zi = sosfilt(self.sos, data, axis=-1, zi=self._zi)
+        self.samples_processed += data.shape[1]
+        return filtered.reshape(chunk.shape)
+
+
+def impulse_response_length(sos, tol=1e-9, max_length=1 << 22):
+    """
+    Number of samples after which the impulse response of a filter stays below tol times its peak.
+
+    Args:
+        sos (np.ndarray): Filter coefficients in second-order sections.
+        tol (float): Relative amplitude at which the response counts as decayed.
+        max_length (int): Longest response to evaluate.
+
+    Returns:
+        int: Length of the impulse response in samples.
+    """
+    length = 1024
+    while True:
+        impulse = np.zeros(length)
+        impulse[0] = 1.0
+        response = np.abs(sosfilt(sos, impulse))
+        above = np.flatnonzero(response > tol * response.max())
+        # Accept once the last quarter of the evaluated response has decayed
+        if above[-1] < 3 * length // 4 or length >= max_length:
+            return int(above[-1]) + 1
+        length *= 2
+
+
+def iter_band_pass_mmg_chunked(sd_file, low_cutoff, high_cutoff, fs_mmg, block_size=65536, filter_order=10, tol=1e-9, common_trailing_zeros=None):
+    """
+    Zero-phase bandpass filtering of the MMG channels of a DAQ file larger than memory.
+    The file is streamed with iter_daq_blocks, and each output block is filtered with sosfiltfilt
+    on a window extended by the impulse response length of the filter on both sides, so the
+    transients of the window edges decay before the kept samples. At the start and end of the
+    recording the window edge is the recording edge and sosfiltfilt pads it as usual.
+
+    The output matches band_pass_mmg_batch on the whole recording to within a few times tol relative
+    to the peak output (below 1e-8 for the default tol of 1e-9 on the recorded sessions), and is
+    identical when block_size covers the whole recording. Memory is bounded by block_size plus twice
+    the impulse response length (2490 samples for the 1-30 Hz filter at 256 Hz).
+
+    Args:
+        sd_file (str): Path to the DAQ .dat file.
+        low_cutoff (float): Low cutoff frequency for the bandpass filter.
+        high_cutoff (float): High cutoff frequency for the bandpass filter.
+        fs_mmg (int): Sampling frequency for MMG sensor data.
+        block_size (int): Number of samples per output block.
+        filter_order (int): Order of the filter (default is 10).
+        tol (float): Relative amplitude at which the edge transients count as decayed.
+        common_trailing_zeros (int): Number of frames dropped from the end of the MMG data,
+                                     e.g. count_trailing_zeros(open_daq_file(daq1_file)).
+
+    Yields:
+        start (int): Sample index of the first column of the block.
+        filtered (np.ndarray): Filtered block of shape (6, n) in the order of mmg_channel_matrix.
+    """
+    sos = design_sos(filter_order // 2, [low_cutoff, high_cutoff], fs_mmg)
+    pad = impulse_response_length(sos, tol)
+
+    # buffer holds the samples from buffer_start on that are still needed
+    buffer = np.empty((6, 0))
+    buffer_start = 0
+    out_start = 0
+    for block in iter_daq_blocks(sd_file, block_size, common_trailing_zeros=common_trailing_zeros):
+        mmg_block = mmg_channel_matrix(dict(zip(MMG_CHANNELS, block["mmg"].T)))
+        buffer = np.concatenate([buffer, mmg_block], axis=1)
+        buffer_end = buffer_start + buffer.shape[1]
+
+        # Emit every output block whose right extension is already read
+        while buffer_end - out_start - pad >= block_size:
+            out_stop = out_start + block_size
+            window_start = max(out_start - pad, 0)
+            filtered = sosfiltfilt(sos, buffer[:, window_start - buffer_start:out_stop + pad - buffer_start], axis=-1)
+            yield out_start, filtered[:, out_start - window_start:out_stop - window_start]
+            out_start = out_stop
+
+            # Drop the samples no later window needs
+            keep_from = max(out_start - pad, 0)
+            buffer = buffer[:, keep_from - buffer_start:]
+            buffer_start = keep_from
+
+    # The remainder reaches the end of the recording
+    buffer_end = buffer_start + buffer.shape[1]
+    if buffer_end > out_start:
+        window_start = max(out_start - pad, 0)
+        filtered = sosfiltfilt(sos, buffer[:, window_start - buffer_start:], axis=-1)
+        yield out_start, filtered[:, out_start - window_start:]
+
+
+def band_pass_mmg_chunked(sd_file, low_cutoff, high_cutoff, fs_mmg, block_size=65536, filter_order=10, tol=1e-9, common_trailing_zeros=None, out=None):
+    """
+    Collects iter_band_pass_mmg_chunked into one (6, N) array.
+
+    Args:
+        out (np.ndarray): Optional preallocated (6, N) array to fill, e.g. a np.lib.format.open_memmap
+                          file so the result does not have to fit in memory either.
+        See iter_band_pass_mmg_chunked for the other arguments.
+
+    Returns:
+        np.ndarray: Filtered MMG data of shape (6, N), the same as band_pass_mmg_batch for this DAQ.
+    """
+    n_frames = os.path.getsize(sd_file) // DAQ_RECORD_DTYPE.itemsize
+    n_samples = max(n_frames - (common_trailing_zeros or 0) - 2, 0)
+    if out is None:
+        out = np.empty((6, n_samples))
+    elif out.shape != (6, n_samples):
+        raise ValueError(f"out has shape {out.shape}, expected {(6, n_samples)}")
+
+    for start, filtered in iter_band_pass_mmg_chunked(sd_file, low_cutoff, high_cutoff, fs_mmg, block_size, filter_order, tol, common_trailing_zeros):
+        out[:, start:start + filtered.shape[1]] = filtered
+
+    logging.info(f"Chunked bandpass filtering for MMG sensors completed for {sd_file}")
+    return out
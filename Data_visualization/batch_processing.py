@@ -0,0 +1,160 @@
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+from config import get_data_dir, get_batch_workers, get_fs_MMG_sensor, get_fs_IMU_sensor, get_cache_dir, get_cache_max_bytes, get_daq_alignment, get_signal_dtype, get_orientation_engine, get_headband_id, get_calibration_dir
+from imu_calibration import load_calibration
+from multirate import window_indices, map_index
+from session_cache import SessionCache, cached_process_multiple_daqs, cached_band_pass_mmg_batch, cached_orientation
+from head_movement import load_gesture_data_from_excel, process_gestures
+from eye_blink_v2 import process_eye_blinks, calculate_threshold
+
+# Pipeline parameters, same values as main.py
+PIPELINE_PARAMS = {
+    "low_cutoff": 1.0,
+    "high_cutoff": 30.0,
+    "pitch_threshold": 0.4,
+    "yaw_threshold_right": 0.15,
+    "yaw_threshold_left": -0.15,
+    "head_min_count": 5,
+    "blink_quantile": 0.6,
+    "blink_min_count": 48,
+}
+
+
+def discover_sessions(data_dir):
+    """
+    Finds every DAQ1/DAQ2 recording pair in a directory and its ground-truth Excel file.
+
+    Sessions are matched by number: DAQ1_IMU_DataNN.dat, DAQ2_DataNN.dat and
+    modified_Sequential_Play_N.xlsx. Incomplete sessions are skipped with a warning.
+
+    Args:
+        data_dir (str): Directory containing the recordings.
+
+    Returns:
+        list: One dict per session with "session", "daq_files" and "excel_file", sorted by session number.
+    """
+    daq1_files, daq2_files, excel_files = {}, {}, {}
+    for file_name in os.listdir(data_dir):
+        path = os.path.join(data_dir, file_name)
+        if match := re.fullmatch(r"DAQ1_IMU_Data(\d+)\.dat", file_name):
+            daq1_files[int(match.group(1))] = path
+        elif match := re.fullmatch(r"DAQ2_Data(\d+)\.dat", file_name):
+            daq2_files[int(match.group(1))] = path
+        elif match := re.fullmatch(r"modified_Sequential_Play_(\d+)\.xlsx", file_name):
+            excel_files[int(match.group(1))] = path
+
+    sessions = []
+    for number in sorted(set(daq1_files) | set(daq2_files) | set(excel_files)):
+        if number not in daq1_files or number not in daq2_files or number not in excel_files:
+            logging.warning(f"Skipping incomplete session {number} in {data_dir}")
+            continue
+        sessions.append({
+            "session": number,
+            "daq_files": [daq1_files[number], daq2_files[number]],
+            "excel_file": excel_files[number],
+        })
+    return sessions
+
+
+def process_session(session, params=PIPELINE_PARAMS):
+    """
+    Runs the parse, filter, EKF, head-movement and eye-blink pipeline for one session.
+
+    Args:
+        session (dict): Session description from discover_sessions.
+        params (dict): Pipeline parameters, see PIPELINE_PARAMS.
+
+    Returns:
+        pd.DataFrame: One row per gesture with head-movement and eye-blink detection results.
+    """
+    daq_file_paths = session["daq_files"]
+    session_label = f"Session{session['session']:02d}"
+    fs_mmg = get_fs_MMG_sensor()
+    fs_imu = get_fs_IMU_sensor()
+    cache = SessionCache(get_cache_dir(), get_cache_max_bytes())
+
+    alignment = get_daq_alignment()
+    dtype = get_signal_dtype()
+    sensor_data_list = cached_process_multiple_daqs(cache, daq_file_paths, fs_mmg, alignment, dtype)
+
+    filtered_data_dict = {}
+    filtered_mmg_list = cached_band_pass_mmg_batch(cache, daq_file_paths, sensor_data_list, params["low_cutoff"], params["high_cutoff"], fs_mmg, alignment=alignment, dtype=dtype)
+    for i, filtered_mmg_data in enumerate(filtered_mmg_list):
+        for j in range(6):
+            filtered_data_dict[f"DAQ_{i+1}_A{j}"] = filtered_mmg_data[j]
+
+    calibration = load_calibration(get_calibration_dir(), session.get("headband_id", get_headband_id()))
+    IMU_RPY_data = cached_orientation(cache, daq_file_paths, sensor_data_list[0], fs_imu, get_orientation_engine(), dtype, calibration)
+    filtered_data_dict["DAQ_1_r"] = IMU_RPY_data[:, 0]
+    filtered_data_dict["DAQ_1_p"] = IMU_RPY_data[:, 1]
+    filtered_data_dict["DAQ_1_y"] = IMU_RPY_data[:, 2]
+
+    gesture_data = load_gesture_data_from_excel(session["excel_file"])
+    mmg_windows = window_indices(gesture_data, fs_mmg)
+    imu_windows = map_index(mmg_windows, fs_mmg, fs_imu)
+    head_results = process_gestures(
+        filtered_data_dict,
+        gesture_data,
+        params["pitch_threshold"],
+        params["yaw_threshold_right"],
+        params["yaw_threshold_left"],
+        fs_imu,
+        params["head_min_count"],
+        windows=imu_windows
+    )
+
+    threshold_daq1, threshold_daq2 = calculate_threshold(filtered_data_dict, gesture_data, fs_mmg, quantile=params["blink_quantile"])
+    blink_results = process_eye_blinks(filtered_data_dict, threshold_daq1, threshold_daq2, gesture_data, fs_mmg, min_count=params["blink_min_count"], windows=mmg_windows)
+
+    return pd.DataFrame({
+        "Session": session["session"],
+        "Gesture": head_results["Gesture"],
+        "Head_Ground_Truth": head_results["Ground_Truth"],
+        "Detected_Movement": head_results["Detected_Movement"],
+        "Head_Result": head_results["Result"],
+        "Blink_Ground_Truth": blink_results["Ground_Truth"],
+        "Detected_Blink": blink_results["Detected_Blink"],
+        "Blink_Result": blink_results["Result"],
+    })
+
+
+def process_all_sessions(data_dir, max_workers=None, params=PIPELINE_PARAMS):
+    """
+    Processes every session in a directory in parallel on a process pool.
+
+    Args:
+        data_dir (str): Directory containing the recordings.
+        max_workers (int): Number of worker processes (default: number of CPUs).
+        params (dict): Pipeline parameters, see PIPELINE_PARAMS.
+
+    Returns:
+        pd.DataFrame: Consolidated results of all sessions, ordered by session.
+    """
+    sessions = discover_sessions(data_dir)
+    logging.info(f"Processing {len(sessions)} sessions from {data_dir} with {max_workers or os.cpu_count()} workers")
+
+    session_results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_session, session, params): session for session in sessions}
+        for future in as_completed(futures):
+            session = futures[future]
+            try:
+                session_results.append(future.result())
+                logging.info(f"Session {session['session']} processed")
+            except Exception as e:
+                logging.error(f"Error processing session {session['session']}: {e}")
+
+    if not session_results:
+        return pd.DataFrame()
+    return pd.concat(session_results, ignore_index=True).sort_values("Session", kind="stable", ignore_index=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    results = process_all_sessions(get_data_dir(), get_batch_workers())
+    print(results)
+    results.to_excel('batch_detection_results.xlsx', index=False)
@@ -0,0 +1,246 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+from config import get_fs_MMG_sensor, get_fs_IMU_sensor
+from daq_processing import process_multiple_daqs, process_imu_data, open_daq_file, raw_channel, channel_slope, count_trailing_zeros
+from band_pass_filter import band_pass, band_pass_mmg_batch, band_pass_mmg_chunked, plot_filtered_mmg
+from kalman_filter import imu_to_roll_pitch_yaw_ekf, plot_roll_pitch_yaw, initialize_ekf, ekf_update, imu_measurements, OrientationKalmanFilter
+from orientation import estimate_orientation, pad_sessions, orientation_batch
+from head_movement import load_gesture_data_from_excel, process_gestures, process_gestures_rowwise, plot_imu_data
+from crossing_index import CrossingIndex
+from eye_blink_v2 import process_eye_blinks, process_eye_blinks_rowwise, detect_blink_events, plot_mmg_data, calculate_threshold
+from visualization import visualize_sensor_data
+from synthetic_daq import generate_session
+from batch_processing import PIPELINE_PARAMS
+
+DEFAULT_DURATIONS_S = [60.0, 600.0, 3600.0]
+
+
+def benchmark_stage(func, n_samples, repeat=1, measure_memory=True):
+    """
+    Times one stage and optionally measures its peak traced memory in a separate run,
+    so tracing overhead does not distort the timing.
+
+    Args:
+        func (callable): Zero-argument function running the stage.
+        n_samples (int): Number of input samples processed by the stage.
+        repeat (int): Number of timed runs, the fastest is reported.
+        measure_memory (bool): Whether to measure peak memory with tracemalloc.
+
+    Returns:
+        dict: seconds, samples, samples_per_s and peak_memory_bytes (None if not measured).
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+
+    peak_memory = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "seconds": seconds,
+        "samples": int(n_samples),
+        "samples_per_s": n_samples / seconds if seconds > 0 else None,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def _materialize(sensor_data_list):
+    """
+    Touches every channel so lazily loaded sensor data is fully parsed and scaled.
+    """
+    return [{sensor_name: np.asarray(sensor_data[sensor_name]) for sensor_name in sensor_data} for sensor_data in sensor_data_list]
+
+
+def pipeline_stages(session, params=PIPELINE_PARAMS):
+    """
+    Prepares the inputs of every pipeline stage for a session and returns the stages to time.
+    Inputs are computed once up front, so each stage is timed on its own.
+
+    Args:
+        session (dict): Session description with "daq_files" and "excel_file".
+        params (dict): Pipeline parameters, see batch_processing.PIPELINE_PARAMS.
+
+    Returns:
+        list: (stage name, zero-argument function, number of input samples) tuples.
+    """
+    fs_mmg = get_fs_MMG_sensor()
+    fs_imu = get_fs_IMU_sensor()
+    daq_files = session["daq_files"]
+
+    sensor_data_list = _materialize(process_multiple_daqs(daq_files, fs_mmg))
+    n_frames = sum(len(open_daq_file(daq_file)) for daq_file in daq_files)
+    raw_aclm_x = raw_channel(open_daq_file(daq_files[0]), "Aclm_X") * channel_slope("Aclm_X")
+    n_mmg = sum(len(sensor_data["A0"]) for sensor_data in sensor_data_list)
+    n_imu = len(sensor_data_list[0]["Aclm_X"])
+
+    filtered_data_dict = {}
+    for i, filtered_mmg_data in enumerate(band_pass_mmg_batch(sensor_data_list, params["low_cutoff"], params["high_cutoff"], fs_mmg)):
+        for j in range(6):
+            filtered_data_dict[f"DAQ_{i+1}_A{j}"] = filtered_mmg_data[j]
+    IMU_RPY_data = imu_to_roll_pitch_yaw_ekf(sensor_data_list[0], fs_imu, "DAQ_1", render=False)
+    filtered_data_dict["DAQ_1_r"] = IMU_RPY_data[:, 0]
+    filtered_data_dict["DAQ_1_p"] = IMU_RPY_data[:, 1]
+    filtered_data_dict["DAQ_1_y"] = IMU_RPY_data[:, 2]
+
+    gesture_data = load_gesture_data_from_excel(session["excel_file"])
+    head_args = (params["pitch_threshold"], params["yaw_threshold_right"], params["yaw_threshold_left"])
+    head_results = process_gestures(filtered_data_dict, gesture_data, *head_args, fs_imu, params["head_min_count"])
+    thresholds = calculate_threshold(filtered_data_dict, gesture_data, fs_mmg, quantile=params["blink_quantile"])
+    blink_results = process_eye_blinks(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=params["blink_min_count"])
+
+    def run_band_pass():
+        for i, sensor_data in enumerate(sensor_data_list):
+            band_pass(f"DAQ_{i+1}", sensor_data, params["low_cutoff"], params["high_cutoff"], fs_mmg, fs_imu, render=False)
+
+    def run_plot_filtered_mmg():
+        for i in range(len(sensor_data_list)):
+            plot_filtered_mmg(f"DAQ_{i+1}", np.vstack([filtered_data_dict[f"DAQ_{i+1}_A{j}"] for j in range(6)]), fs_mmg)
+
+    def run_band_pass_mmg_chunked():
+        common_trailing_zeros = count_trailing_zeros(open_daq_file(daq_files[0]))
+        for i, daq_file in enumerate(daq_files):
+            band_pass_mmg_chunked(daq_file, params["low_cutoff"], params["high_cutoff"], fs_mmg, common_trailing_zeros=common_trailing_zeros if i else None)
+
+    def run_ekf_update_filterpy():
+        # Per-sample filterpy predict/update, the baseline of OrientationKalmanFilter
+        ekf = initialize_ekf(fs_imu)
+        for z in imu_measurements(sensor_data_list[0]):
+            ekf_update(ekf, z[0:3], z[3:6], z[6:9])
+
+    # Orientation of a batch of sessions filtered in lockstep, against one filter per session
+    batch_measurements, batch_lengths = pad_sessions([imu_measurements(sensor_data_list[0])] * 4)
+
+    def run_orientation_per_session():
+        for session_measurements, length in zip(batch_measurements, batch_lengths):
+            OrientationKalmanFilter(fs_imu).filter(session_measurements[:length])
+
+    # Re-scoring the windows for a range of min_count values, scanning the samples each time or from one crossing index
+    blink_min_counts = range(8, 136, 8)
+
+    def run_blink_min_count_sweep():
+        for min_count in blink_min_counts:
+            process_eye_blinks(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=min_count)
+
+    def run_blink_min_count_sweep_indexed():
+        index = CrossingIndex(filtered_data_dict)
+        for min_count in blink_min_counts:
+            process_eye_blinks(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=min_count, index=index)
+
+    def run_visualize_sensor_data():
+        for i, sensor_data in enumerate(sensor_data_list):
+            visualize_sensor_data(sensor_data, f"DAQ_{i+1}", fs_mmg, fs_imu)
+
+    return [
+        ("process_daq_data", lambda: _materialize(process_multiple_daqs(daq_files, fs_mmg)), n_frames),
+        ("process_imu_data", lambda: process_imu_data(raw_aclm_x), len(raw_aclm_x)),
+        ("band_pass", run_band_pass, n_mmg),
+        ("band_pass_mmg_batch", lambda: band_pass_mmg_batch(sensor_data_list, params["low_cutoff"], params["high_cutoff"], fs_mmg), n_mmg),
+        ("band_pass_mmg_chunked", run_band_pass_mmg_chunked, n_mmg),
+        ("ekf_update_filterpy", run_ekf_update_filterpy, n_imu),
+        ("imu_to_roll_pitch_yaw_ekf", lambda: imu_to_roll_pitch_yaw_ekf(sensor_data_list[0], fs_imu, "DAQ_1", render=False), n_imu),
+        ("imu_to_roll_pitch_yaw_steady_state", lambda: imu_to_roll_pitch_yaw_ekf(sensor_data_list[0], fs_imu, "DAQ_1", render=False, steady_state=True), n_imu),
+        ("orientation_complementary", lambda: estimate_orientation(sensor_data_list[0], fs_imu, "complementary"), n_imu),
+        ("orientation_madgwick", lambda: estimate_orientation(sensor_data_list[0], fs_imu, "madgwick"), n_imu),
+        ("orientation_kalman_4_sessions", run_orientation_per_session, 4 * n_imu),
+        ("orientation_batch_kalman_4_sessions", lambda: orientation_batch(batch_measurements, batch_lengths, fs_imu, "kalman"), 4 * n_imu),
+        ("process_gestures", lambda: process_gestures(filtered_data_dict, gesture_data, *head_args, fs_imu, params["head_min_count"]), n_imu),
+        ("process_gestures_rowwise", lambda: process_gestures_rowwise(filtered_data_dict, gesture_data, *head_args, fs_imu, params["head_min_count"]), n_imu),
+        ("calculate_threshold", lambda: calculate_threshold(filtered_data_dict, gesture_data, fs_mmg, quantile=params["blink_quantile"]), n_mmg),
+        ("process_eye_blinks", lambda: process_eye_blinks(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=params["blink_min_count"]), n_mmg),
+        ("process_eye_blinks_rowwise", lambda: process_eye_blinks_rowwise(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=params["blink_min_count"]), n_mmg),
+        ("blink_min_count_sweep", run_blink_min_count_sweep, len(blink_min_counts) * n_mmg),
+        ("blink_min_count_sweep_indexed", run_blink_min_count_sweep_indexed, len(blink_min_counts) * n_mmg),
+        ("detect_blink_events", lambda: detect_blink_events(filtered_data_dict, *thresholds, fs_mmg, min_count=params["blink_min_count"]), n_mmg),
+        ("plot_filtered_mmg", run_plot_filtered_mmg, n_mmg),
+        ("plot_roll_pitch_yaw", lambda: plot_roll_pitch_yaw("DAQ_1", IMU_RPY_data, fs_imu), n_imu),
+        ("plot_imu_data", lambda: plot_imu_data(filtered_data_dict, gesture_data, *head_args, head_results, fs_imu), n_imu),
+        ("plot_mmg_data", lambda: plot_mmg_data(filtered_data_dict, gesture_data, fs_mmg, blink_results), n_mmg),
+        ("visualize_sensor_data", run_visualize_sensor_data, n_mmg),
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(durations_s=DEFAULT_DURATIONS_S, repeat=1, measure_memory=True, stages=None):
+    """
+    Benchmarks every pipeline stage on synthetic recordings of the given lengths.
+    Runs inside a temporary directory so the figures saved by the stages do not touch the working tree.
+
+    Args:
+        durations_s (list): Recording lengths in seconds.
+        repeat (int): Number of timed runs per stage.
+        measure_memory (bool): Whether to measure peak memory per stage.
+        stages (list): Names of the stages to run (default: all).
+
+    Returns:
+        dict: Environment metadata and one result per (duration, stage).
+    """
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": [],
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            for i, duration_s in enumerate(durations_s, start=1):
+                logging.warning(f"Benchmarking a {duration_s:.0f} s recording")
+                session = generate_session(work_dir, i, duration_s)
+                for name, func, n_samples in pipeline_stages(session):
+                    if stages and name not in stages:
+                        continue
+                    result = benchmark_stage(func, n_samples, repeat, measure_memory)
+                    result.update({"stage": name, "duration_s": duration_s})
+                    report["results"].append(result)
+                    logging.warning(f"{name:>28}: {result['seconds']:9.3f} s, {result['samples_per_s'] or 0:14.0f} samples/s")
+        finally:
+            os.chdir(cwd)
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the processing pipeline stages on synthetic recordings.")
+    parser.add_argument("--durations", type=float, nargs="+", default=DEFAULT_DURATIONS_S, help="Recording lengths in seconds")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage (fastest is reported)")
+    parser.add_argument("--stages", nargs="+", help="Only run these stages")
+    parser.add_argument("--no-memory", action="store_true", help="Skip peak memory measurement")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_benchmarks(args.durations, args.repeat, not args.no_memory, args.stages)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark results written to {args.output}")
@@ -0,0 +1,94 @@
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+from config import get_data_dir, get_fs_MMG_sensor
+from eye_blink_v2 import detect_eye_blink, slice_blink_data, detect_blink_events
+from batch_processing import PIPELINE_PARAMS, discover_sessions
+from precision_check import run_signal_path
+
+
+def staggered_blink_data(fs, duration_s=8.0, threshold=0.5):
+    """
+    Builds MMG data where A0 to A3 of DAQ 1 are each above threshold for 10 samples, one after the
+    other (from samples 500, 520, 540 and 560), so that no sample has 4 sensors above threshold
+    while the window rule of detect_eye_blink holds.
+
+    Returns:
+        dict: filtered_data_dict with DAQ_1_A0 to DAQ_2_A5.
+    """
+    n_samples = int(duration_s * fs)
+    filtered_data_dict = {f"DAQ_{daq}_A{i}": np.zeros(n_samples) for daq in (1, 2) for i in range(6)}
+    for i, start in enumerate((500, 520, 540, 560)):
+        filtered_data_dict[f"DAQ_1_A{i}"][start:start + 10] = 2 * threshold
+    return filtered_data_dict
+
+
+def uncovered_detections(filtered_data_dict, thresholds_daq1, thresholds_daq2, fs, events, window_s=2.0, min_count=4, step=None):
+    """
+    Finds the windows of window_s seconds, every step samples, in which detect_eye_blink detects a
+    blink on either DAQ but that overlap no event of detect_blink_events.
+
+    Args:
+        filtered_data_dict (dict): Contains MMG data for DAQ 1 and DAQ 2 sensors.
+        thresholds_daq1 (list): Thresholds for each sensor of DAQ 1.
+        thresholds_daq2 (list): Thresholds for each sensor of DAQ 2.
+        fs (float): Sampling frequency of the sensor (samples per second).
+        events (pd.DataFrame): Output of detect_blink_events with the same parameters.
+        window_s (float): Length of the windows in seconds.
+        min_count (int): Minimum number of data points that must exceed the threshold.
+        step (int): Distance between window starts in samples (default: window / 16).
+
+    Returns:
+        list: (daq_label, start) of every uncovered detecting window.
+    """
+    window = max(int(window_s * fs), 1)
+    step = step or max(window // 16, 1)
+    onsets = events["Onset"].to_numpy()
+    offsets = events["Offset"].to_numpy()
+
+    uncovered = []
+    for daq_label, thresholds in (("DAQ_1", thresholds_daq1), ("DAQ_2", thresholds_daq2)):
+        length = min(len(filtered_data_dict[f"{daq_label}_A{i}"]) for i in range(6))
+        for start in range(0, length - window + 1, step):
+            gesture_window_data = slice_blink_data(filtered_data_dict, slice(start, start + window), daq_label)
+            if not detect_eye_blink(gesture_window_data, thresholds, min_points_above_threshold=min_count):
+                continue
+            # Events are sorted and disjoint: the first one ending after start is the only candidate
+            i = np.searchsorted(offsets, start, side="right")
+            if i == len(onsets) or onsets[i] >= start + window:
+                uncovered.append((daq_label, start))
+    return uncovered
+
+
+def check_blink_events(filtered_data_dict, thresholds_daq1, thresholds_daq2, fs, window_s=2.0, min_count=4, step=None):
+    """
+    Runs detect_blink_events and counts the detecting windows it leaves uncovered, see uncovered_detections.
+
+    Returns:
+        dict: Number of events and of uncovered detecting windows.
+    """
+    events = detect_blink_events(filtered_data_dict, thresholds_daq1, thresholds_daq2, fs, window_s=window_s, min_count=min_count)
+    uncovered = uncovered_detections(filtered_data_dict, thresholds_daq1, thresholds_daq2, fs, events, window_s, min_count, step)
+    return {"events": len(events), "uncovered_windows": len(uncovered)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that every window detected by detect_eye_blink overlaps an event of detect_blink_events.")
+    parser.add_argument("--data-dir", default=get_data_dir(), help="Directory containing the recordings")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    fs_mmg = get_fs_MMG_sensor()
+    reports = [{"session": "staggered", **check_blink_events(staggered_blink_data(fs_mmg), [0.5] * 6, [0.5] * 6, fs_mmg)}]
+    for session in discover_sessions(args.data_dir):
+        stages, _, _ = run_signal_path(session, "float64")
+        filtered_data_dict = {name.split("/", 1)[1]: data for name, data in stages.items() if name.startswith("band_pass/")}
+        thresholds = [list(stages[f"threshold/DAQ_{daq}"]) for daq in (1, 2)]
+        reports.append({"session": session["session"], **check_blink_events(filtered_data_dict, *thresholds, fs_mmg, min_count=PIPELINE_PARAMS["blink_min_count"])})
+
+    reports = pd.DataFrame(reports)
+    print(reports)
+    if reports["uncovered_windows"].any():
+        raise SystemExit("Detecting windows without a blink event")
@@ -24,4 +24,96 @@ def get_excel_file_path():
     """
     Fetch the path of the Excel file containing gesture data.
     """
-    return os.getenv("EXCEL_FILE_PATH", "Data_files/modified_Sequential_Play_4.xlsx")
\ No newline at end of file
+    return os.getenv("EXCEL_FILE_PATH", "Data_files/modified_Sequential_Play_4.xlsx")
+
+def get_cache_dir():
+    """
+    Fetch the directory of the on-disk session cache.
+    """
+    return os.getenv("SESSION_CACHE_DIR", "./.session_cache")
+
+def get_cache_max_bytes():
+    """
+    Fetch the size bound of the on-disk session cache in bytes.
+    """
+    return int(os.getenv("SESSION_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+def get_data_dir():
+    """
+    Fetch the directory holding the DAQ recordings and ground-truth Excel files.
+    """
+    return os.getenv("DATA_DIR", "./Data_files")
+
+def get_batch_workers():
+    """
+    Fetch the number of worker processes for batch processing (None uses all CPUs).
+    """
+    workers = os.getenv("BATCH_WORKERS")
+    return int(workers) if workers else None
+
+def get_daq_alignment():
+    """
+    Fetch how DAQ2 is aligned to DAQ1: "trailing_zeros" (trim by DAQ1's trailing zeros),
+    "xcorr" (cross-correlation lag) or "xcorr_drift" (lag and linear clock drift).
+    """
+    return os.getenv("DAQ_ALIGNMENT", "trailing_zeros")
+
+def get_filter_cache_size():
+    """
+    Fetch the number of filter designs kept in memory by filter_design.
+    """
+    return int(os.getenv("FILTER_CACHE_SIZE", "64"))
+
+def get_render_mode():
+    """
+    Fetch how figures are rendered: "inline" (in the pipeline process), "background"
+    (queued to a process pool) or "off" (no figures, for headless batch runs).
+    """
+    return os.getenv("RENDER_MODE", "inline")
+
+def get_render_workers():
+    """
+    Fetch the number of background render processes (default 1).
+    """
+    return int(os.getenv("RENDER_WORKERS", "1"))
+
+def get_signal_dtype():
+    """
+    Fetch the float type of the signal path: "float64" (default) or "float32", which halves
+    memory and memory bandwidth. See precision_check.py for the accuracy of float32.
+    """
+    return os.getenv("SIGNAL_DTYPE", "float64")
+
+def get_ekf_steady_state():
+    """
+    Fetch whether the orientation filter uses the steady-state Kalman fast path
+    (EKF_STEADY_STATE=1) instead of the per-sample predict/update loop.
+    """
+    return os.getenv("EKF_STEADY_STATE", "0") == "1"
+
+def get_orientation_engine():
+    """
+    Fetch the orientation engine of orientation.ORIENTATION_ENGINES: "kalman" (default),
+    "kalman_steady_state", "complementary" or "madgwick". EKF_STEADY_STATE=1 selects
+    "kalman_steady_state" when ORIENTATION_ENGINE is not set.
+    """
+    return os.getenv("ORIENTATION_ENGINE", "kalman_steady_state" if get_ekf_steady_state() else "kalman")
+
+def get_headband_id():
+    """
+    Fetch the ID of the headband that recorded the DAQ files (None: no IMU calibration is applied).
+    """
+    return os.getenv("HEADBAND_ID")
+
+def get_calibration_dir():
+    """
+    Fetch the directory of the per-headband IMU calibration store (see imu_calibration.py).
+    """
+    return os.getenv("CALIBRATION_DIR", "./calibration")
+
+def get_blink_events():
+    """
+    Fetch whether main.py also runs the continuous blink detector (BLINK_EVENTS=1) and compares
+    its events with the gesture windows.
+    """
+    return os.getenv("BLINK_EVENTS", "0") == "1"
@@ -0,0 +1,99 @@
+import numpy as np
+
+# Threshold conditions, applied sample by sample as condition(signal, threshold)
+CONDITIONS = {
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+    "abs_gt": lambda data, threshold: np.abs(data) > threshold,
+}
+
+
+class ThresholdCrossings:
+    """
+    Samples of one signal that satisfy one threshold condition, stored as a prefix count and as
+    the sorted array of their positions. Windows [start, end) are then queried without touching
+    the samples: counts in O(1) and the first crossing in O(log n).
+    """
+    __slots__ = ("prefix", "positions")
+
+    def __init__(self, mask):
+        """
+        Args:
+            mask (np.ndarray): Boolean array, True for the samples that satisfy the condition.
+        """
+        self.prefix = np.zeros(len(mask) + 1, dtype=np.int32 if len(mask) < 2**31 else np.int64)
+        np.add.accumulate(mask, dtype=self.prefix.dtype, out=self.prefix[1:])
+        self.positions = np.flatnonzero(mask)
+
+    def count(self, starts, ends):
+        """
+        Number of crossings in each window [start, end), 0 for empty windows.
+
+        Args:
+            starts (np.ndarray): First sample of each window, see multirate.window_bounds.
+            ends (np.ndarray): End (exclusive) of each window, ends >= starts.
+
+        Returns:
+            np.ndarray: Counts, one per window.
+        """
+        return self.prefix[ends] - self.prefix[starts]
+
+    def first(self, starts, ends):
+        """
+        Position of the first crossing in each window [start, end).
+
+        Args:
+            starts (np.ndarray): First sample of each window.
+            ends (np.ndarray): End (exclusive) of each window.
+
+        Returns:
+            np.ndarray: Sample index of the first crossing, -1 for windows without crossing.
+        """
+        # The k-th crossing overall is the first one at or after start, k = number of crossings before start
+        k = self.prefix[starts]
+        if len(self.positions) == 0:
+            return np.full(np.shape(k), -1, dtype=np.int64)
+        found = self.prefix[ends] > k
+        return np.where(found, self.positions[np.minimum(k, len(self.positions) - 1)], -1)
+
+
+class CrossingIndex:
+    """
+    Threshold crossings of the signals of a session, built on first use for each
+    (signal, condition, threshold) and kept for every later window query. One index serves any
+    number of windows and parameter combinations over the same signals.
+    """
+    __slots__ = ("signals", "crossings_by_key")
+
+    def __init__(self, signals):
+        """
+        Args:
+            signals (dict): Signals by name, e.g. filtered_data_dict.
+        """
+        self.signals = signals
+        self.crossings_by_key = {}
+
+    def crossings(self, name, condition, threshold):
+        """
+        Returns the ThresholdCrossings of signals[name] for a condition of CONDITIONS and a threshold.
+        """
+        key = (name, condition, float(threshold))
+        if key not in self.crossings_by_key:
+            if condition not in CONDITIONS:
+                raise ValueError(f"Unknown threshold condition '{condition}', expected one of {sorted(CONDITIONS)}")
+            self.crossings_by_key[key] = ThresholdCrossings(CONDITIONS[condition](self.signals[name], threshold))
+        return self.crossings_by_key[key]
+
+    def count(self, name, condition, threshold, starts, ends):
+        """
+        Number of samples of signals[name] satisfying the condition in each window [start, end).
+        """
+        return self.crossings(name, condition, threshold).count(starts, ends)
+
+    def first(self, name, condition, threshold, starts, ends):
+        """
+        First sample of signals[name] satisfying the condition in each window [start, end), -1 if none.
+        """
+        return self.crossings(name, condition, threshold).first(starts, ends)
@@ -0,0 +1,190 @@
+import logging
+import numpy as np
+from scipy.signal import sosfiltfilt, correlate, correlation_lags
+
+from daq_processing import process_daq_data, MMG_CHANNELS
+from filter_design import design_sos
+
+# Both DAQs carry an accelerometer on A5 to A7, which sees the same head motion on either side
+ALIGNMENT_CHANNELS = ["A5", "A6", "A7"]
+
+
+def alignment_signal(sensor_data, fs, channels=ALIGNMENT_CHANNELS, smoothing_s=0.25):
+    """
+    Builds the signal used to align DAQs: the smoothed, standardized envelope of the
+    band-passed accelerometer channels.
+
+    Args:
+        sensor_data (dict): Sensor data of one DAQ.
+        fs (int): Sampling frequency of the MMG sensors.
+        channels (list): Channels combined into the envelope.
+        smoothing_s (float): Length of the moving-average smoothing window in seconds.
+
+    Returns:
+        np.ndarray: Zero-mean, unit-variance envelope.
+    """
+    data = np.vstack([np.asarray(sensor_data[sensor_name], dtype=float) for sensor_name in channels])
+    sos = design_sos(5, [1.0, 30.0], fs)
+    envelope = np.abs(sosfiltfilt(sos, data, axis=-1))
+    envelope = np.sum(envelope / (envelope.std(axis=1, keepdims=True) + 1e-12), axis=0)
+
+    window = max(int(smoothing_s * fs), 1)
+    envelope = np.convolve(envelope, np.ones(window) / window, mode='same')
+    return (envelope - envelope.mean()) / (envelope.std() + 1e-12)
+
+
+def estimate_lag(reference, signal, max_lag=None, center=0):
+    """
+    Estimates the lag between two signals with FFT-based cross-correlation, in O(N log N).
+
+    Args:
+        reference (np.ndarray): Reference signal (DAQ1).
+        signal (np.ndarray): Signal to align (DAQ2).
+        max_lag (int): Largest distance in samples from center to consider (default: any).
+        center (int): Lag around which to search.
+
+    Returns:
+        lag (int): Lag in samples, signal[n] corresponds to reference[n + lag].
+        peak (float): Normalized correlation at the lag (1.0 for identical signals).
+    """
+    correlation = correlate(reference, signal, mode='full', method='fft')
+    lags = correlation_lags(len(reference), len(signal), mode='full')
+    if max_lag is not None:
+        correlation = np.where(np.abs(lags - center) <= max_lag, correlation, -np.inf)
+
+    k = int(np.argmax(correlation))
+    norm = np.sqrt(np.dot(reference, reference) * np.dot(signal, signal)) + 1e-12
+    return int(lags[k]), float(correlation[k] / norm)
+
+
+def estimate_lag_and_drift(reference, signal, fs, segment_s=10.0, max_lag=None, search_s=1.0, min_peak=0.5):
+    """
+    Estimates a linear clock model lag(n) = lag + drift * n between two signals.
+    The global lag is found first, then per-segment lags are refined around it and fitted with a line.
+
+    Args:
+        reference (np.ndarray): Reference signal (DAQ1).
+        signal (np.ndarray): Signal to align (DAQ2).
+        fs (int): Sampling frequency of the signals.
+        segment_s (float): Length of the segments used to measure drift, in seconds.
+        max_lag (int): Largest global lag in samples to consider (default: any).
+        search_s (float): Search range around the global lag for each segment, in seconds.
+        min_peak (float): Segments whose correlation peak is below this value are ignored.
+
+    Returns:
+        lag (float): Lag in samples at reference sample 0.
+        drift (float): Change of lag per reference sample.
+    """
+    global_lag, _ = estimate_lag(reference, signal, max_lag)
+    segment = int(segment_s * fs)
+    search = int(search_s * fs)
+
+    centers, segment_lags, weights = [], [], []
+    for start in range(0, len(reference) - segment + 1, segment):
+        # The matching part of the signal starts global_lag samples earlier
+        signal_start = start - global_lag - search
+        signal_stop = start - global_lag + segment + search
+        if signal_start < 0 or signal_stop > len(signal):
+            continue
+        reference_segment = reference[start:start + segment]
+        signal_segment = signal[signal_start:signal_stop]
+
+        # The segment-local lag of the global model is -search
+        lag, peak = estimate_lag(reference_segment - reference_segment.mean(), signal_segment - signal_segment.mean(), max_lag=search, center=-search)
+        if peak < min_peak:
+            continue
+        # Convert the segment-local lag back to a global lag
+        centers.append(start + segment / 2)
+        segment_lags.append(lag + start - signal_start)
+        weights.append(peak)
+
+    if len(centers) < 2:
+        logging.info("Not enough correlated segments to estimate drift, using constant lag")
+        return float(global_lag), 0.0
+
+    drift, lag = np.polyfit(centers, segment_lags, 1, w=weights)
+    return float(lag), float(drift)
+
+
+def resample_to_reference(sensor_data, n_samples, lag, drift=0.0, channels=MMG_CHANNELS):
+    """
+    Resamples channels onto the reference timebase given a clock model.
+    Reference sample m is taken from position m - (lag + drift * m) of the signal,
+    using linear interpolation and holding the edge values outside the recording.
+
+    Args:
+        sensor_data (dict): Sensor data of the DAQ to align.
+        n_samples (int): Number of samples of the reference timebase.
+        lag (float): Lag in samples at reference sample 0.
+        drift (float): Change of lag per reference sample.
+        channels (list): Channels to resample, other channels are passed through.
+
+    Returns:
+        dict: Sensor data with the given channels on the reference timebase.
+    """
+    reference_index = np.arange(n_samples)
+    positions = reference_index - (lag + drift * reference_index)
+
+    aligned_data = dict(sensor_data)
+    for sensor_name in channels:
+        data = np.asarray(sensor_data[sensor_name])
+        if drift == 0.0 and float(lag).is_integer():
+            # Pure shift: take samples directly instead of interpolating
+            aligned_data[sensor_name] = data[np.clip(positions.astype(int), 0, len(data) - 1)]
+        else:
+            aligned_data[sensor_name] = np.interp(positions, np.arange(len(data)), data).astype(data.dtype, copy=False)
+    return aligned_data
+
+
+def align_daqs(sensor_data_list, fs, estimate_drift=False, max_lag_s=10.0):
+    """
+    Aligns the MMG data of every DAQ to DAQ1 using cross-correlation of the accelerometer envelope.
+
+    Args:
+        sensor_data_list (list): Sensor data of each DAQ, DAQ1 first.
+        fs (int): Sampling frequency of the MMG sensors.
+        estimate_drift (bool): Whether to estimate linear clock drift in addition to the lag.
+        max_lag_s (float): Largest lag to consider, in seconds.
+
+    Returns:
+        aligned_list (list): Sensor data of each DAQ with MMG channels on DAQ1's timebase.
+        clock_models (list): (lag, drift) in samples for each DAQ, (0.0, 0.0) for DAQ1.
+    """
+    reference_data = sensor_data_list[0]
+    n_samples = len(reference_data[MMG_CHANNELS[0]])
+    reference = alignment_signal(reference_data, fs)
+
+    aligned_list = [reference_data]
+    clock_models = [(0.0, 0.0)]
+    for i, sensor_data in enumerate(sensor_data_list[1:], start=2):
+        signal = alignment_signal(sensor_data, fs)
+        max_lag = int(max_lag_s * fs)
+        if estimate_drift:
+            lag, drift = estimate_lag_and_drift(reference, signal, fs, max_lag=max_lag)
+        else:
+            lag, peak = estimate_lag(reference, signal, max_lag)
+            lag, drift = float(lag), 0.0
+            logging.info(f"DAQ_{i} correlation peak with DAQ_1: {peak:.2f}")
+
+        logging.info(f"DAQ_{i} aligned to DAQ_1 with lag {lag:.1f} samples ({lag / fs:.3f} s) and drift {drift:.2e}")
+        aligned_list.append(resample_to_reference(sensor_data, n_samples, lag, drift))
+        clock_models.append((lag, drift))
+
+    return aligned_list, clock_models
+
+
+def process_multiple_daqs_aligned(daq_files, fs_sensor, estimate_drift=False, dtype=np.float64):
+    """
+    Processes multiple DAQ files and aligns them to DAQ1 by cross-correlation instead of
+    trimming DAQ2 with the common trailing zeros of DAQ1.
+
+    Returns:
+        list: One dict of sensor data per DAQ file, MMG channels on DAQ1's timebase.
+    """
+    sensor_data_list = []
+    for idx, daq_file in enumerate(daq_files):
+        sensor_data, _ = process_daq_data(daq_file, fs_sensor, calculate_trailing_zeros=(idx == 0), dtype=dtype)
+        sensor_data_list.append(sensor_data)
+
+    aligned_list, _ = align_daqs(sensor_data_list, fs_sensor, estimate_drift)
+    return aligned_list
@@ -0,0 +1,168 @@
+import json
+import logging
+import lzma
+import os
+import struct
+import zlib
+import numpy as np
+
+from daq_processing import DAQ_CHANNELS, ADC_RESOLUTIONS, DAQ_RECORD_DTYPE, channel_slope, extract_sensor_data
+
+# File layout: MAGIC, compressed chunks, JSON footer, footer length (uint64), MAGIC
+ARCHIVE_MAGIC = b"DAQA"
+ARCHIVE_VERSION = 1
+
+_COMPRESSORS = {
+    None: (lambda data: data, lambda data: data),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+def _encode_chunk(chunk, delta, compression):
+    """
+    Packs a (n, 17) int16 chunk channel by channel, optionally delta-encoded and compressed.
+    """
+    packed = np.ascontiguousarray(chunk.T)
+    if delta:
+        # int16 differences wrap around on overflow and are undone exactly by the wrapping cumsum
+        packed[:, 1:] = np.diff(packed, axis=1)
+    return _COMPRESSORS[compression][0](packed.tobytes())
+
+
+def _decode_chunk(data, n_frames, delta, compression):
+    """
+    Inverse of _encode_chunk, returns a (n, 17) int16 chunk.
+    """
+    packed = np.frombuffer(_COMPRESSORS[compression][1](data), dtype="<i2").reshape(len(DAQ_CHANNELS), n_frames)
+    if delta:
+        packed = np.cumsum(packed, axis=1, dtype=np.int16)
+    return packed.T
+
+
+def convert_to_archive(sd_file, archive_file, chunk_frames=65536, compression="zlib", delta=False):
+    """
+    Converts a DAQ .dat file into the packed int16 archival format.
+    The 13-bit MMG and 16-bit IMU counts are stored losslessly as int16 together with
+    the per-channel ADC resolution and volt scale, split into independently compressed chunks.
+
+    Args:
+        sd_file (str): Path to the DAQ .dat file.
+        archive_file (str): Path of the archive to write.
+        chunk_frames (int): Number of frames per chunk.
+        compression (str): "zlib", "lzma" or None.
+        delta (bool): Whether to delta-encode each channel before compression. Off by default
+                      because the zero-filled IMU frames of DAQ1 compress better without it.
+
+    Returns:
+        dict: The archive metadata (footer).
+    """
+    if compression not in _COMPRESSORS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {list(_COMPRESSORS)}")
+
+    logging.info(f"Converting {sd_file} to archive {archive_file}")
+    n_frames = os.path.getsize(sd_file) // DAQ_RECORD_DTYPE.itemsize
+    chunks = []
+
+    with open(sd_file, "rb") as src, open(archive_file, "wb") as dst:
+        dst.write(ARCHIVE_MAGIC)
+        for chunk_start in range(0, n_frames, chunk_frames):
+            count = min(chunk_frames, n_frames - chunk_start)
+            raw = np.fromfile(src, dtype="<i4", count=count * len(DAQ_CHANNELS)).reshape(count, len(DAQ_CHANNELS))
+            if raw.min(initial=0) < np.iinfo(np.int16).min or raw.max(initial=0) > np.iinfo(np.int16).max:
+                raise ValueError(f"{sd_file} has counts outside the int16 range in frames {chunk_start}-{chunk_start + count}")
+
+            data = _encode_chunk(raw.astype(np.int16), delta, compression)
+            chunks.append({"offset": dst.tell(), "nbytes": len(data), "start": chunk_start, "n_frames": count})
+            dst.write(data)
+
+        footer = {
+            "version": ARCHIVE_VERSION,
+            "n_frames": n_frames,
+            "channels": DAQ_CHANNELS,
+            "adc_resolutions": ADC_RESOLUTIONS,
+            "slopes": {sensor_name: channel_slope(sensor_name) for sensor_name in DAQ_CHANNELS},
+            "compression": compression,
+            "delta": delta,
+            "chunks": chunks,
+        }
+        encoded = json.dumps(footer).encode()
+        dst.write(encoded)
+        dst.write(struct.pack("<Q", len(encoded)))
+        dst.write(ARCHIVE_MAGIC)
+
+    logging.info(f"Archive written: {os.path.getsize(archive_file)} bytes from {os.path.getsize(sd_file)} bytes")
+    return footer
+
+
+class DAQArchive:
+    """
+    Reader for archives written by convert_to_archive.
+    Only the chunks overlapping a requested frame range are read and decompressed.
+
+    Args:
+        archive_file (str): Path to the archive.
+    """
+
+    def __init__(self, archive_file):
+        self.archive_file = archive_file
+        with open(archive_file, "rb") as f:
+            f.seek(-12, os.SEEK_END)
+            footer_length, magic = struct.unpack("<Q4s", f.read(12))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"{archive_file} is not a DAQ archive")
+            f.seek(-12 - footer_length, os.SEEK_END)
+            self.metadata = json.loads(f.read(footer_length))
+
+        if self.metadata["version"] != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported archive version {self.metadata['version']} in {archive_file}")
+        self.n_frames = self.metadata["n_frames"]
+        self.channels = self.metadata["channels"]
+
+    def read_frames(self, start=0, stop=None):
+        """
+        Reads raw counts for a range of frames.
+
+        Args:
+            start (int): First frame.
+            stop (int): End frame (exclusive, default: end of the recording).
+
+        Returns:
+            np.ndarray: Array of shape (stop - start, 17) with int32 counts, like the original .dat file.
+        """
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        start = min(max(start, 0), stop)
+        frames = np.empty((stop - start, len(self.channels)), dtype=np.int32)
+
+        with open(self.archive_file, "rb") as f:
+            for chunk in self.metadata["chunks"]:
+                chunk_start = chunk["start"]
+                chunk_stop = chunk_start + chunk["n_frames"]
+                if chunk_stop <= start or chunk_start >= stop:
+                    continue
+                f.seek(chunk["offset"])
+                decoded = _decode_chunk(f.read(chunk["nbytes"]), chunk["n_frames"], self.metadata["delta"], self.metadata["compression"])
+                lo = max(start, chunk_start)
+                hi = min(stop, chunk_stop)
+                frames[lo - start:hi - start] = decoded[lo - chunk_start:hi - chunk_start]
+
+        return frames
+
+    def read_channel(self, sensor_name, start=0, stop=None):
+        """
+        Reads one channel in volts for a range of frames, using the stored scale.
+        """
+        j = self.channels.index(sensor_name)
+        return self.read_frames(start, stop)[:, j] * self.metadata["slopes"][sensor_name]
+
+
+def process_archive_data(archive_file, calculate_trailing_zeros=False, common_trailing_zeros=None):
+    """
+    Archive counterpart of process_daq_data: converts to voltage and extracts sensor data.
+
+    Returns:
+        sensor_data (LazySensorData): Channels in volts, each scaled on first access.
+        trailing_zeros (int): Common trailing zeros of Aclm_X and Aclm_Y (0 unless calculated).
+    """
+    sd_data = DAQArchive(archive_file).read_frames()
+    return extract_sensor_data(sd_data, calculate_trailing_zeros, common_trailing_zeros)
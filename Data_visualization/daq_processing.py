@@ -133,12 +133,309 @@
 
 import numpy as np
 import logging
+import os
+from collections.abc import Mapping
+from functools import partial
+
+# Column layout of one firmware record: 8 MMG channels followed by the 9-axis IMU
+DAQ_CHANNELS = [
+    "A0", "A1", "A2", "A3", "A4", "A5", "A6", "A7",
+    "Aclm_X", "Aclm_Y", "Aclm_Z", "Gyro_X", "Gyro_Y", "Gyro_Z", "Mag_X", "Mag_Y", "Mag_Z"
+]
+MMG_CHANNELS = DAQ_CHANNELS[:8]
+IMU_CHANNELS = DAQ_CHANNELS[8:]
+
+ADC_RESOLUTIONS = {
+    "A0": 13, "A1": 13, "A2": 13, "A3": 13, "A4": 13,
+    "A5": 13, "A6": 13, "A7": 13,
+    "Aclm_X": 16, "Aclm_Y": 16, "Aclm_Z": 16,
+    "Gyro_X": 16, "Gyro_Y": 16, "Gyro_Z": 16,
+    "Mag_X": 16, "Mag_Y": 16, "Mag_Z": 16
+}
+
+# One 68-byte record (17 x little-endian int32) as written by the firmware
+DAQ_RECORD_DTYPE = np.dtype([(name, "<i4") for name in DAQ_CHANNELS])
+
+
+def channel_slope(sensor_name):
+    """
+    Returns the volts-per-count scale factor for a channel based on its ADC resolution.
+    """
+    max_adc_value = 2**ADC_RESOLUTIONS[sensor_name] - 1
+    return 3.3 / max_adc_value
+
+
+class LazySensorData(Mapping):
+    """
+    Read-only dict of sensor channels that materializes each channel on first access.
+
+    Args:
+        loaders (dict): Maps each sensor name to a zero-argument callable returning its data.
+    """
+
+    def __init__(self, loaders):
+        self._loaders = dict(loaders)
+        self._cache = {}
+
+    def __getitem__(self, sensor_name):
+        if sensor_name not in self._cache:
+            self._cache[sensor_name] = self._loaders[sensor_name]()
+        return self._cache[sensor_name]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+    def loaded_channels(self):
+        """
+        Returns the names of the channels that have been materialized so far.
+        """
+        return list(self._cache)
+
+
+def open_daq_file(sd_file):
+    """
+    Memory-maps a DAQ binary file as an array of 17-field int32 records.
+    Opening is constant time; pages are only read when a channel is accessed.
+
+    Args:
+        sd_file (str): Path to the DAQ .dat file.
+
+    Returns:
+        np.ndarray: Read-only structured array (np.memmap) with one field per channel.
+    """
+    n_frames = os.path.getsize(sd_file) // DAQ_RECORD_DTYPE.itemsize
+    if n_frames == 0:
+        return np.empty(0, dtype=DAQ_RECORD_DTYPE)
+    return np.memmap(sd_file, dtype=DAQ_RECORD_DTYPE, mode="r", shape=(n_frames,))
+
+
+def raw_channel(sd_data, sensor_name):
+    """
+    Returns the raw int32 counts of one channel as a strided view (no copy).
 
-def process_multiple_daqs(daq_files, fs_sensor):
+    Args:
+        sd_data (np.ndarray): Structured record array from open_daq_file, or a (m, 17) int32 array.
+        sensor_name (str): Channel name, e.g. "A0" or "Aclm_X".
+    """
+    if sd_data.dtype.names:
+        return sd_data[sensor_name]
+    return sd_data[:, DAQ_CHANNELS.index(sensor_name)]
+
+
+def _as_matrix(sd_data):
+    """
+    Returns the records as a (m, 17) int32 array without copying.
+    """
+    if sd_data.dtype.names:
+        return np.asarray(sd_data).view("<i4").reshape(len(sd_data), len(DAQ_CHANNELS))
+    return sd_data
+
+
+def first_imu_frame(sd_data, chunk_size=4096):
+    """
+    Finds the first frame in which any IMU channel is non-zero.
+    The search is done in chunks so a memory-mapped file is only read up to that frame.
+
+    Args:
+        sd_data (np.ndarray): Structured record array from open_daq_file, or a (m, 17) int32 array.
+        chunk_size (int): Number of frames scanned per step.
+
+    Returns:
+        int or None: Index of the first IMU frame, or None if the IMU block is all zeros.
+    """
+    sd_matrix = _as_matrix(sd_data)
+    imu_start = len(MMG_CHANNELS)
+    for chunk_start in range(0, len(sd_matrix), chunk_size):
+        chunk = sd_matrix[chunk_start:chunk_start + chunk_size, imu_start:]
+        nonzero_rows = np.flatnonzero(np.any(chunk != 0, axis=1))
+        if len(nonzero_rows) > 0:
+            return chunk_start + int(nonzero_rows[0])
+    return None
+
+
+def deinterleave_imu(sd_data, dtype=np.float64):
+    """
+    Recovers the 64 Hz IMU stream from the 256 Hz frame for all 9 IMU channels at once.
+    Starting from the first non-zero IMU frame, every 4th frame is kept and scaled to volts.
+
+    This matches process_imu_data applied per channel whenever all IMU channels become
+    non-zero on the same frame, which is how the firmware writes them.
+
+    Args:
+        sd_data (np.ndarray): Structured record array from open_daq_file, or a (m, 17) int32 array.
+        dtype (np.dtype): Float type of the result, float32 halves the memory of the float64 default.
+
+    Returns:
+        np.ndarray: Array of shape (N, 9) in IMU_CHANNELS order.
+    """
+    first_frame = first_imu_frame(sd_data)
+    if first_frame is None:
+        return np.empty((0, len(IMU_CHANNELS)), dtype=dtype)
+
+    slopes = np.array([channel_slope(sensor_name) for sensor_name in IMU_CHANNELS], dtype=dtype)
+    return np.multiply(_as_matrix(sd_data)[first_frame::4, len(MMG_CHANNELS):], slopes, dtype=dtype)
+
+
+def _load_scaled(column, slope, start=0, stop=None, dtype=np.float64):
+    # The counts fit in 16 bits, so converting them to float32 is exact
+    return np.multiply(column[start:stop], slope, dtype=dtype)
+
+
+class _DeinterleavedIMU:
+    """
+    De-interleaves the IMU block of a recording once and serves its columns.
+    """
+
+    def __init__(self, sd_data, dtype=np.float64):
+        self._sd_data = sd_data
+        self._dtype = dtype
+        self._imu_data = None
+
+    def column(self, j):
+        if self._imu_data is None:
+            self._imu_data = deinterleave_imu(self._sd_data, self._dtype)
+        return self._imu_data[:, j]
+
+
+def _load_empty(dtype=np.float64):
+    return np.empty(0, dtype=dtype)
+
+
+def count_trailing_zeros(sd_data):
+    """
+    Counts the common zeros of Aclm_X and Aclm_Y in the last 3 frames of a DAQ1 recording.
+    Only the last 3 records are read, so this is cheap on a memory-mapped file.
+
+    Args:
+        sd_data (np.ndarray): Structured record array from open_daq_file, or a (m, 17) int32 array.
+
+    Returns:
+        int: Number of trailing frames to drop from the MMG data.
+    """
+    # Get the last 3 values from imu_aclm_x and imu_aclm_y (zero counts are zero volts)
+    imu_aclm_x_last3 = raw_channel(sd_data, "Aclm_X")[-3:]
+    imu_aclm_y_last3 = raw_channel(sd_data, "Aclm_Y")[-3:]
+
+    # Count the number of common zeros in the last 3 positions of imu_aclm_x and imu_aclm_y
+    return int(np.sum((imu_aclm_x_last3 == 0) & (imu_aclm_y_last3 == 0)))
+
+
+def iter_daq_blocks(sd_file, block_size=4096, calculate_imu=False, common_trailing_zeros=None):
+    """
+    Streams a DAQ file in fixed-size blocks of frames so memory is bounded by block_size.
+    MMG data follows the same trimming as extract_sensor_data (first two frames dropped,
+    common_trailing_zeros frames dropped at the end). IMU data is de-interleaved with its
+    phase carried across block boundaries, so concatenating all blocks reproduces
+    deinterleave_imu.
+
+    Args:
+        sd_file (str): Path to the DAQ .dat file.
+        block_size (int): Number of 256 Hz frames read per block.
+        calculate_imu (bool): Whether to de-interleave the IMU channels (DAQ1 only).
+        common_trailing_zeros (int): Number of frames to drop from the end of the MMG data,
+                                     e.g. count_trailing_zeros(open_daq_file(daq1_file)).
+
+    Yields:
+        dict: "mmg_start" and "imu_start" are the sample indices of the first row of the block,
+              "mmg" is an (n, 8) array in MMG_CHANNELS order and "imu" an (k, 9) array in
+              IMU_CHANNELS order, both in volts.
+    """
+    n_frames = os.path.getsize(sd_file) // DAQ_RECORD_DTYPE.itemsize
+    mmg_stop = n_frames - common_trailing_zeros if common_trailing_zeros is not None else n_frames
+    mmg_slopes = np.array([channel_slope(sensor_name) for sensor_name in MMG_CHANNELS])
+    imu_slopes = np.array([channel_slope(sensor_name) for sensor_name in IMU_CHANNELS])
+
+    first_frame = None
+    mmg_start = 0
+    imu_start = 0
+    with open(sd_file, "rb") as f:
+        for block_start in range(0, n_frames, block_size):
+            records = np.fromfile(f, dtype=DAQ_RECORD_DTYPE, count=min(block_size, n_frames - block_start))
+            sd_matrix = _as_matrix(records)
+            block_end = block_start + len(sd_matrix)
+
+            # MMG rows of this block that fall within [2, mmg_stop)
+            lo = max(2, block_start) - block_start
+            hi = max(min(mmg_stop, block_end) - block_start, lo)
+            mmg_data = sd_matrix[lo:hi, :len(MMG_CHANNELS)] * mmg_slopes
+
+            imu_data = np.empty((0, len(IMU_CHANNELS)))
+            if calculate_imu:
+                if first_frame is None:
+                    local_first = first_imu_frame(sd_matrix)
+                    if local_first is not None:
+                        first_frame = block_start + local_first
+
+                if first_frame is not None:
+                    # Offset of the next IMU frame (every 4th frame after the first) within this block
+                    if first_frame >= block_start:
+                        offset = first_frame - block_start
+                    else:
+                        offset = (first_frame - block_start) % 4
+                    imu_data = sd_matrix[offset::4, len(MMG_CHANNELS):] * imu_slopes
+
+            yield {"mmg_start": mmg_start, "mmg": mmg_data, "imu_start": imu_start, "imu": imu_data}
+            mmg_start += len(mmg_data)
+            imu_start += len(imu_data)
+
+
+def read_range(sd_file, t_start, t_end, fs_mmg=256, fs_imu=64, calculate_imu=False, common_trailing_zeros=None):
+    """
+    Reads only the frames of a DAQ file that cover a time window.
+    Records have a fixed size, so the window maps directly to a byte range of the
+    memory-mapped file. Sample indices follow extract_blink_data and
+    extract_gesture_data (int(time * fs)), so the result equals slicing the
+    output of process_daq_data with the same window.
+
+    Args:
+        sd_file (str): Path to the DAQ .dat file.
+        t_start (float): Start time of the window in seconds.
+        t_end (float): End time of the window in seconds.
+        fs_mmg (int): Sampling frequency of the MMG sensors.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        calculate_imu (bool): Whether to read the de-interleaved IMU channels (DAQ1 only).
+        common_trailing_zeros (int): Number of frames dropped from the end of the MMG data.
+
+    Returns:
+        dict: Windowed sensor data in volts for every channel in DAQ_CHANNELS.
+    """
+    sd_data = open_daq_file(sd_file)
+    sd_matrix = _as_matrix(sd_data)
+    n_frames = len(sd_matrix)
+    window_data = {}
+
+    # MMG sample k is frame k + 2 because the first two frames are dropped
+    mmg_length = max(n_frames - 2 - (common_trailing_zeros or 0), 0)
+    mmg_lo = min(max(int(t_start * fs_mmg), 0), mmg_length)
+    mmg_hi = min(max(int(t_end * fs_mmg), mmg_lo), mmg_length)
+    mmg_frames = sd_matrix[2 + mmg_lo:2 + mmg_hi, :len(MMG_CHANNELS)]
+    for j, sensor_name in enumerate(MMG_CHANNELS):
+        window_data[sensor_name] = mmg_frames[:, j] * channel_slope(sensor_name)
+
+    # IMU sample k is frame first_frame + 4 * k
+    first_frame = first_imu_frame(sd_data) if calculate_imu else None
+    if first_frame is None:
+        imu_frames = np.empty((0, len(IMU_CHANNELS)), dtype=sd_matrix.dtype)
+    else:
+        imu_length = (n_frames - first_frame + 3) // 4
+        imu_lo = min(max(int(t_start * fs_imu), 0), imu_length)
+        imu_hi = min(max(int(t_end * fs_imu), imu_lo), imu_length)
+        imu_frames = sd_matrix[first_frame + 4 * imu_lo:first_frame + 4 * imu_hi:4, len(MMG_CHANNELS):]
+    for j, sensor_name in enumerate(IMU_CHANNELS):
+        window_data[sensor_name] = imu_frames[:, j] * channel_slope(sensor_name)
+
+    return window_data
+
+
+def process_multiple_daqs(daq_files, fs_sensor, dtype=np.float64):
     """
     Processes multiple DAQ files sequentially.
     DAQ1 is used to determine the common_trailing_zeros from the IMU data, 
     which is then used in DAQ2 for trimming MMG data.
+    Channels are converted to dtype (float64 by default, float32 to halve memory).
     """
     sensor_data_list = []
     common_trailing_zeros = None  # Variable to store trailing zeros from DAQ1
@@ -146,34 +443,29 @@ def process_multiple_daqs(daq_files, fs_sensor):
     for idx, daq_file in enumerate(daq_files):
         if idx == 0:
             # Process DAQ1 and calculate common_trailing_zeros from IMU data
-            sensor_data, common_trailing_zeros = process_daq_data(daq_file, fs_sensor, calculate_trailing_zeros=True)
+            sensor_data, common_trailing_zeros = process_daq_data(daq_file, fs_sensor, calculate_trailing_zeros=True, dtype=dtype)
         else:
             # For other DAQ files, use the common_trailing_zeros from DAQ1 to trim MMG data
-            sensor_data, _ = process_daq_data(daq_file, fs_sensor, calculate_trailing_zeros=False, common_trailing_zeros=common_trailing_zeros)
+            sensor_data, _ = process_daq_data(daq_file, fs_sensor, calculate_trailing_zeros=False, common_trailing_zeros=common_trailing_zeros, dtype=dtype)
         
         sensor_data_list.append(sensor_data)
 
     return sensor_data_list
 
-def process_daq_data(sd_file, fs_sensor, calculate_trailing_zeros=False, common_trailing_zeros=None):
+def process_daq_data(sd_file, fs_sensor, calculate_trailing_zeros=False, common_trailing_zeros=None, dtype=np.float64):
     """
     Processes DAQ data file, converts to voltage, and extracts sensor data.
+    The file is memory-mapped, so channels are only read and scaled when accessed.
     If calculate_trailing_zeros is True, it calculates common_trailing_zeros from IMU data.
     If common_trailing_zeros is provided, it trims MMG data based on this value.
     """
     try:
         logging.info(f"Processing DAQ data from {sd_file}")
-        # Read binary data
-        with open(sd_file, "rb") as f:
-            sd_data_original = np.fromfile(f, dtype=np.int32)
-
-        # Reshape data
-        n = 17  # Number of columns in converted data
-        m = len(sd_data_original) // n
-        sd_data = sd_data_original.reshape((m, n))
+        # Memory-map the binary records instead of reading the whole file
+        sd_data = open_daq_file(sd_file)
 
         # Extract sensor data and potentially calculate common_trailing_zeros from IMU data
-        sensor_data, trailing_zeros = extract_sensor_data(sd_data, calculate_trailing_zeros, common_trailing_zeros)
+        sensor_data, trailing_zeros = extract_sensor_data(sd_data, calculate_trailing_zeros, common_trailing_zeros, dtype)
 
         logging.info(f"Data processing successful for {sd_file}")
         return sensor_data, trailing_zeros
@@ -182,73 +474,42 @@ def process_daq_data(sd_file, fs_sensor, calculate_trailing_zeros=False, common_
         logging.error(f"Error processing DAQ data from {sd_file}: {e}")
         return None, None
 
-def extract_sensor_data(sd_data, calculate_trailing_zeros=False, common_trailing_zeros=None):
+def extract_sensor_data(sd_data, calculate_trailing_zeros=False, common_trailing_zeros=None, dtype=np.float64):
     """
     Extracts and converts sensor data from raw DAQ data.
     If calculate_trailing_zeros is True, it calculates the trailing zeros from IMU data (Aclm_X and Aclm_Y).
     If common_trailing_zeros is provided, it trims MMG data based on this value.
+
+    Args:
+        sd_data (np.ndarray): Structured record array from open_daq_file, or a (m, 17) int32 array.
+        dtype (np.dtype): Float type of the channels (float64 or float32).
+
+    Returns:
+        sensor_data (LazySensorData): Channels in volts, each scaled on first access.
+        trailing_zeros (int): Common trailing zeros of Aclm_X and Aclm_Y (0 unless calculated).
     """
-    sensor_data = {
-        "A0": [], "A1": [], "A2": [], "A3": [], "A4": [],
-        "A5": [], "A6": [], "A7": [], "Aclm_X": [], "Aclm_Y": [], "Aclm_Z": [],
-        "Gyro_X": [], "Gyro_Y": [], "Gyro_Z": [], "Mag_X": [],
-        "Mag_Y": [], "Mag_Z": []
-    }
-
-    adc_resolutions = {
-        "A0": 13, "A1": 13, "A2": 13, "A3": 13, "A4": 13,
-        "A5": 13, "A6": 13, "A7": 13,
-        "Aclm_X": 16, "Aclm_Y": 16, "Aclm_Z": 16,
-        "Gyro_X": 16, "Gyro_Y": 16, "Gyro_Z": 16,
-        "Mag_X": 16, "Mag_Y": 16, "Mag_Z": 16
-    }
-
-    imu_channels = ["Aclm_X", "Aclm_Y", "Aclm_Z", "Gyro_X", "Gyro_Y", "Gyro_Z", "Mag_X", "Mag_Y", "Mag_Z"]
+    loaders = {}
     trailing_zeros = 0
 
     if calculate_trailing_zeros:
-        # Process IMU channels for DAQ1 to calculate the trailing zeros
-        for i, sensor_name in enumerate(imu_channels, start=8):
-            adc_resolution = adc_resolutions[sensor_name]
-            max_adc_value = 2**adc_resolution - 1
-            slope = 3.3 / max_adc_value
-            raw_imu_data = sd_data[:, i] * slope
+        # IMU channels for DAQ1 are de-interleaved lazily from the raw columns
+        imu_block = _DeinterleavedIMU(sd_data, dtype)
+        for j, sensor_name in enumerate(IMU_CHANNELS):
+            loaders[sensor_name] = partial(imu_block.column, j)
 
-            if sensor_name == "Aclm_X":
-                IMU_aclm_x = raw_imu_data
-                
-            if sensor_name == "Aclm_Y":
-                IMU_aclm_y = raw_imu_data
-
-            sensor_data[sensor_name] = process_imu_data(raw_imu_data)
-
-        
-
-        # Get the last 3 values from imu_aclm_x and imu_aclm_y
-        imu_aclm_x_last3 = IMU_aclm_x[-3:]
-        imu_aclm_y_last3 = IMU_aclm_y[-3:]
-
-        # Count the number of common zeros in the last 3 positions of imu_aclm_x and imu_aclm_y
-        trailing_zeros = 0
-        for x_val, y_val in zip(imu_aclm_x_last3, imu_aclm_y_last3):
-            if x_val == 0 and y_val == 0:
-                trailing_zeros += 1
+        trailing_zeros = count_trailing_zeros(sd_data)
         print("\nCommon trailing zeros:", trailing_zeros)
+    else:
+        for sensor_name in IMU_CHANNELS:
+            loaders[sensor_name] = partial(_load_empty, dtype)
 
-    # Process MMG sensors (A0 to A7)
-    for i, sensor_name in enumerate(list(sensor_data.keys())[:8]):
-        adc_resolution = adc_resolutions[sensor_name]
-        max_adc_value = 2**adc_resolution - 1
-        slope = 3.3 / max_adc_value
-
-        # Trim MMG data using common_trailing_zeros from DAQ1 if available
-        if common_trailing_zeros is not None:
-            raw_mmg_data = sd_data[2:-common_trailing_zeros, i] * slope
-        else:
-            raw_mmg_data = sd_data[2:, i] * slope  # No trimming if no trailing zeros
-
-        sensor_data[sensor_name] = raw_mmg_data
+    # Process MMG sensors (A0 to A7): drop the first two frames and trim using
+    # common_trailing_zeros from DAQ1 if available
+    stop = len(sd_data) - common_trailing_zeros if common_trailing_zeros is not None else None
+    for sensor_name in MMG_CHANNELS:
+        loaders[sensor_name] = partial(_load_scaled, raw_channel(sd_data, sensor_name), channel_slope(sensor_name), 2, stop, dtype)
 
+    sensor_data = LazySensorData({name: loaders[name] for name in DAQ_CHANNELS})
     return sensor_data, trailing_zeros
 
 def process_imu_data(data):
@@ -263,24 +524,10 @@ def process_imu_data(data):
         Processed IMU data where after finding the first value, the next 3 values are skipped and 
         every 4th value is counted.
     """
-    processed_data = []
-    found_first_non_zero = False
-    i = 0
-    
-    while i < len(data):
-        if not found_first_non_zero:
-            # Find and append the first non-zero value
-            if data[i] != 0:
-                processed_data.append(data[i])
-                found_first_non_zero = True
-        else:
-            # After the first value, skip the next 3 values and take the 4th
-            if i + 3 < len(data):
-                processed_data.append(data[i + 3])
-            i += 3  # Skip 3 values
-            
-        # Increment the counter to continue checking the data
-        i += 1
+    data = np.asarray(data)
+    nonzero = np.flatnonzero(data)
+    if len(nonzero) == 0:
+        return np.array([])
 
-    print("\nProcessed sensor data:", np.sum(processed_data))
-    return np.array(processed_data)
+    # Keep the first non-zero value and every 4th value after it
+    return data[nonzero[0]::4]
@@ -2,6 +2,9 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import logging
+
+from multirate import window_slices, window_bounds, time_to_index
 
 
 def detect_eye_blink(gesture_window_data, thresholds, min_points_above_threshold=4):
@@ -80,40 +83,144 @@ def extract_blink_data(filtered_data_dict, start_time, end_time, fs, daq_label):
     start_index = int(start_time * fs)
     end_index = int(end_time * fs)
 
+    return slice_blink_data(filtered_data_dict, slice(start_index, end_index), daq_label)
+
+def slice_blink_data(filtered_data_dict, window, daq_label):
+    """
+    Takes the MMG data of a blink window given as a slice of sample indices.
+
+    Args:
+        filtered_data_dict (dict): Contains MMG data for each DAQ sensor.
+        window (slice): Sample window, e.g. from multirate.window_slices.
+        daq_label (str): Label for DAQ ("DAQ_1" or "DAQ_2").
+
+    Returns:
+        gesture_window_data (dict): Contains windowed MMG data for the blink gesture (A0 to A5).
+    """
     # Extract MMG data for A0 to A5 for the given DAQ and make the values absolute
     gesture_window_data = {
-        f"A{i}": [abs(value) for value in filtered_data_dict[f"{daq_label}_A{i}"][start_index:end_index]]
+        f"A{i}": np.abs(filtered_data_dict[f"{daq_label}_A{i}"][window])
         for i in range(6)
     }
     
     return gesture_window_data
 
-def process_eye_blinks(filtered_data_dict, thresholds_daq1, thresholds_daq2, blink_data, fs, min_count=4):
+def count_above_threshold(sensor_data, threshold, starts, ends):
+    """
+    Counts the samples of every window whose absolute value exceeds a threshold, with one pass
+    over the span of the windows: the above-threshold mask is summed between consecutive window
+    bounds by np.add.reduceat, a segmented prefix sum that never materializes the running total.
+
+    Args:
+        sensor_data (np.ndarray): Filtered MMG signal of one sensor.
+        threshold (float): Threshold on the absolute value.
+        starts (np.ndarray): First sample of each window, see multirate.window_bounds.
+        ends (np.ndarray): End (exclusive) of each window.
+
+    Returns:
+        np.ndarray: Number of samples above the threshold in each window.
+    """
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    first, last = starts.min(), ends.max()
+    span = sensor_data[first:last]
+
+    # |x| > t without materializing |x| (the same for t >= 0, including NaN), plus one sample
+    # so that window bounds at the end of the span are valid reduceat indices
+    above = np.zeros(len(span) + 1, dtype=bool)
+    if threshold >= 0:
+        np.greater(span, threshold, out=above[:-1])
+        above[:-1] |= np.less(span, -threshold)
+    else:
+        np.greater(np.abs(span), threshold, out=above[:-1])
+
+    # Sums over [start, end) at the even positions; reduceat returns the element at start for empty windows
+    bounds = np.column_stack((starts - first, ends - first)).ravel()
+    counts = np.add.reduceat(above, bounds, dtype=np.int64)[::2]
+    return np.where(ends > starts, counts, 0)
+
+def detect_eye_blinks(filtered_data_dict, thresholds, blink_data, fs, daq_label, min_points_above_threshold=4, index=None, windows=None):
+    """
+    Columnar version of detect_eye_blink: evaluates every window of blink_data for one DAQ at once.
+    With a crossing index the counts are read from its prefix counts instead of the samples.
+
+    Args:
+        filtered_data_dict (dict): Contains MMG data for each DAQ sensor.
+        thresholds (list): Thresholds for each sensor (A0 to A5) to detect eye blinks.
+        blink_data (pd.DataFrame): DataFrame containing pressed and released times.
+        fs (float): Sampling frequency of the sensor (samples per second).
+        daq_label (str): Label for DAQ ("DAQ_1" or "DAQ_2").
+        min_points_above_threshold (int): Minimum number of data points that must exceed the threshold.
+        index (CrossingIndex): Optional crossing index over filtered_data_dict, see crossing_index.py.
+        windows (np.ndarray): Window indices at fs computed beforehand, see multirate.window_indices.
+
+    Returns:
+        np.ndarray: Boolean array, True for the windows where at least 4 sensors detect a blink.
+    """
+    sensors_detected = np.zeros(len(blink_data), dtype=np.int64)
+    bounds = {}  # Window bounds per signal length, the sensors of a DAQ usually share one
+    for i in range(6):
+        key = f"{daq_label}_A{i}"
+        sensor_data = filtered_data_dict[key]
+        if len(sensor_data) not in bounds:
+            bounds[len(sensor_data)] = window_bounds(blink_data, fs, len(sensor_data), windows)
+        starts, ends = bounds[len(sensor_data)]
+        if index is None:
+            counts = count_above_threshold(sensor_data, thresholds[i], starts, ends)
+        else:
+            counts = index.count(key, "abs_gt", thresholds[i], starts, ends)
+        sensors_detected += counts >= min_points_above_threshold
+    return sensors_detected >= 4
+
+def process_eye_blinks(filtered_data_dict, thresholds_daq1, thresholds_daq2, blink_data, fs, min_count=4, index=None, windows=None):
     """
     Processes a list of eye blink gestures and applies the blink detection for each blink window.
+    All windows are evaluated at once per sensor, see detect_eye_blinks.
     
     Args:
         filtered_data_dict (dict): Contains MMG data for DAQ 1 and DAQ 2 sensors.
         blink_data (pd.DataFrame): DataFrame containing gesture, pressed, released times, and eye blink ground truth.
         fs (float): Sampling frequency of the sensor (samples per second).
         min_count (int): Minimum number of data points that must exceed the threshold to detect a blink.
+        index (CrossingIndex): Optional crossing index over filtered_data_dict, to reuse when re-scoring
+                               windows or parameters with the same thresholds.
+        windows (np.ndarray): Window indices at fs computed beforehand, see multirate.window_indices.
 
     Returns:
         results (pd.DataFrame): DataFrame containing gesture, detected blinks, and comparison with ground truth.
     """
+    daq1_blink_detected = detect_eye_blinks(filtered_data_dict, thresholds_daq1, blink_data, fs, "DAQ_1", min_count, index, windows)
+    daq2_blink_detected = detect_eye_blinks(filtered_data_dict, thresholds_daq2, blink_data, fs, "DAQ_2", min_count, index, windows)
+
+    # 0: both eyes, 1: left eye (DAQ 1), 2: right eye (DAQ 2), -1: no blink detected
+    detected = np.select([daq1_blink_detected & daq2_blink_detected, daq1_blink_detected, daq2_blink_detected], [0, 1, 2], -1)
+    ground_truth = blink_data['Eye_blink'].to_numpy()
+    result = np.where(detected < 0, "No Blink Detected", np.where(detected == ground_truth, "Match", "No Match"))
+
+    return pd.DataFrame({
+        "Gesture": blink_data['Gesture'].tolist(),
+        "Ground_Truth": ground_truth.tolist(),
+        "Detected_Blink": [None if blink < 0 else blink for blink in detected.tolist()],
+        "Result": result.tolist(),
+    })
+
+def process_eye_blinks_rowwise(filtered_data_dict, thresholds_daq1, thresholds_daq2, blink_data, fs, min_count=4):
+    """
+    Row-by-row reference implementation of process_eye_blinks using detect_eye_blink on each window.
+    """
     results = []
+    # Sample windows of all gestures, computed once
+    windows = window_slices(blink_data, fs)
     
-    for i, row in blink_data.iterrows():
-        start_time = row['Pressed']
-        end_time = row['Released']
+    for (i, row), window in zip(blink_data.iterrows(), windows):
         gesture_name = row['Gesture']
         ground_truth = row['Eye_blink']  # 0: both eyes, 1: left eye, 2: right eye
         
         # Extract MMG data for DAQ 1 and DAQ 2
         # if i == 0 or i ==1:
         #     continue
-        gesture_window_data_daq1 = extract_blink_data(filtered_data_dict, start_time, end_time, fs, "DAQ_1")
-        gesture_window_data_daq2 = extract_blink_data(filtered_data_dict, start_time, end_time, fs, "DAQ_2")
+        gesture_window_data_daq1 = slice_blink_data(filtered_data_dict, window, "DAQ_1")
+        gesture_window_data_daq2 = slice_blink_data(filtered_data_dict, window, "DAQ_2")
         # # Define thresholds for each sensor in DAQ 1 and DAQ 2
         # thresholds_daq1 = [0.08, 0.125, 0.1, 0.06, 0.1, 0.4]  # Manual thresholds for DAQ 1
         # thresholds_daq2 = [0.03, 0.02, 0.09, 0.05, 0.02, 0.5]  # Manual thresholds for DAQ 2
@@ -155,6 +262,170 @@ def process_eye_blinks(filtered_data_dict, thresholds_daq1, thresholds_daq2, bli
     return pd.DataFrame(results)
 
 
+def sliding_window_counts(above, window):
+    """
+    Counts the True samples in every window of a given length, from the difference of one cumulative sum.
+
+    Args:
+        above (np.ndarray): Boolean array, e.g. the samples of one sensor above its threshold.
+        window (int): Window length in samples.
+
+    Returns:
+        np.ndarray: Count of the window starting at each sample, len(above) - window + 1 values.
+    """
+    prefix = np.zeros(len(above) + 1, dtype=np.int32 if len(above) < 2**31 else np.int64)
+    np.add.accumulate(above, dtype=prefix.dtype, out=prefix[1:])
+    return prefix[window:] - prefix[:len(prefix) - window]
+
+def window_coverage(starts, window, length):
+    """
+    Marks the samples covered by a set of windows of one length.
+
+    Args:
+        starts (np.ndarray): Boolean array, True for the first sample of every window.
+        window (int): Window length in samples.
+        length (int): Number of samples of the signal.
+
+    Returns:
+        np.ndarray: Boolean array with one value per sample.
+    """
+    # A window starting at k covers samples k to k + window - 1
+    edges = np.zeros(length + 1, dtype=np.int32)
+    edges[:len(starts)] += starts
+    edges[window:window + len(starts)] -= starts
+    return np.cumsum(edges[:length]) > 0
+
+def blink_activity(filtered_data_dict, thresholds, daq_label, window, min_count=4):
+    """
+    Marks the samples of a DAQ that take part in a blink, within the windows where the rule of
+    detect_eye_blink holds (at least 4 of the 6 sensors with min_count samples above their threshold):
+    the samples at which at least 4 sensors are above their threshold together, or, in a window
+    without such a sample (e.g. sensors above one after the other), the samples at which one of the
+    sensors that met min_count is above its threshold. Every such window therefore contains active samples.
+
+    Args:
+        filtered_data_dict (dict): Contains MMG data for each DAQ sensor.
+        thresholds (list): Thresholds for each sensor (A0 to A5).
+        daq_label (str): Label for DAQ ("DAQ_1" or "DAQ_2").
+        window (int): Window length in samples.
+        min_count (int): Minimum number of data points that must exceed the threshold.
+
+    Returns:
+        np.ndarray: Boolean array with one value per sample of the DAQ.
+    """
+    length = min(len(filtered_data_dict[f"{daq_label}_A{i}"]) for i in range(6))
+    if length < window:
+        return np.zeros(length, dtype=bool)
+
+    above = [np.abs(filtered_data_dict[f"{daq_label}_A{i}"][:length]) > thresholds[i] for i in range(6)]
+    sensor_detected = [sliding_window_counts(sensor_above, window) >= min_count for sensor_above in above]
+    detecting = np.sum(sensor_detected, axis=0, dtype=np.int8) >= 4
+    together = np.sum(above, axis=0, dtype=np.int8) >= 4
+
+    active = window_coverage(detecting, window, length) & together
+    without_together = detecting & (sliding_window_counts(together, window) == 0)
+    if without_together.any():
+        for sensor_above, detected in zip(above, sensor_detected):
+            active |= window_coverage(without_together & detected, window, length) & sensor_above
+    return active
+
+def detect_blink_events(filtered_data_dict, thresholds_daq1, thresholds_daq2, fs, window_s=2.0, min_count=4, min_gap_s=0.5):
+    """
+    Finds blinks anywhere in a recording, without ground-truth windows. Every window of window_s
+    seconds is evaluated like process_eye_blinks evaluates a gesture window; an event spans the
+    active samples of the detecting windows (see blink_activity), and active samples less than
+    min_gap_s apart belong to the same event. An event is a blink of both eyes if both DAQs are
+    active within it, otherwise of the eye of the active DAQ.
+
+    Args:
+        filtered_data_dict (dict): Contains MMG data for DAQ 1 and DAQ 2 sensors.
+        thresholds_daq1 (list): Thresholds for each sensor of DAQ 1, see calculate_threshold.
+        thresholds_daq2 (list): Thresholds for each sensor of DAQ 2.
+        fs (float): Sampling frequency of the sensor (samples per second).
+        window_s (float): Length of the sliding window in seconds (the gesture windows are 2 s).
+        min_count (int): Minimum number of data points that must exceed the threshold.
+        min_gap_s (float): Shortest pause in seconds between two events.
+
+    Returns:
+        events (pd.DataFrame): One row per event with Onset and Offset (sample indices of the first active
+                               sample and after the last one), Onset_s and Offset_s (seconds) and
+                               Detected_Blink (0: both, 1: left, 2: right).
+    """
+    window = max(int(window_s * fs), 1)
+    active_daq1 = blink_activity(filtered_data_dict, thresholds_daq1, "DAQ_1", window, min_count)
+    active_daq2 = blink_activity(filtered_data_dict, thresholds_daq2, "DAQ_2", window, min_count)
+    length = max(len(active_daq1), len(active_daq2))
+    active_daq1 = np.pad(active_daq1, (0, length - len(active_daq1)))
+    active_daq2 = np.pad(active_daq2, (0, length - len(active_daq2)))
+
+    # Events are the runs of active samples of either DAQ, split at pauses of at least min_gap_s
+    active = np.flatnonzero(active_daq1 | active_daq2)
+    splits = np.flatnonzero(np.diff(active) > max(int(min_gap_s * fs), 1))
+    onsets = active[np.concatenate(([0], splits + 1))] if len(active) else active
+    offsets = active[np.concatenate((splits, [len(active) - 1]))] + 1 if len(active) else active
+
+    detected = np.zeros(len(onsets), dtype=np.int64)
+    if len(onsets):
+        bounds = np.column_stack((onsets, offsets)).ravel()
+        in_daq1 = np.add.reduceat(np.append(active_daq1, False), bounds, dtype=np.int64)[::2] > 0
+        in_daq2 = np.add.reduceat(np.append(active_daq2, False), bounds, dtype=np.int64)[::2] > 0
+        detected = np.select([in_daq1 & in_daq2, in_daq1], [0, 1], 2)
+
+    return pd.DataFrame({
+        "Onset": onsets,
+        "Offset": offsets,
+        "Onset_s": onsets / fs,
+        "Offset_s": offsets / fs,
+        "Detected_Blink": detected,
+    })
+
+def match_blink_events(events, blink_data, fs):
+    """
+    Compares continuously detected blink events with the ground truth: an event belongs to the
+    gesture windows containing its midpoint, and a window with several events takes the longest.
+    Events overlapping no gesture window are logged as false detections.
+
+    Args:
+        events (pd.DataFrame): Output of detect_blink_events.
+        blink_data (pd.DataFrame): DataFrame containing gesture, pressed, released times, and eye blink ground truth.
+        fs (float): Sampling frequency of the sensor (samples per second).
+
+    Returns:
+        results (pd.DataFrame): Same columns as process_eye_blinks, plus Event (row of events, None if no event matches).
+    """
+    onsets = events["Onset"].to_numpy()
+    offsets = events["Offset"].to_numpy()
+    starts, ends = time_to_index(blink_data['Pressed'], fs), time_to_index(blink_data['Released'], fs)
+
+    # Events are sorted and disjoint, so are their midpoints: those in [start, end) are a range of events
+    midpoints = (onsets + offsets) / 2
+    first = np.searchsorted(midpoints, starts, side="left")
+    last = np.searchsorted(midpoints, ends, side="left")
+    matched_events = [int(i + np.argmax(offsets[i:j] - onsets[i:j])) if i < j else None for i, j in zip(first, last)]
+
+    ground_truth = blink_data['Eye_blink'].tolist()
+    detected = [None if event is None else int(events["Detected_Blink"].iloc[event]) for event in matched_events]
+    results = [
+        "No Blink Detected" if blink is None else "Match" if blink == truth else "No Match"
+        for blink, truth in zip(detected, ground_truth)
+    ]
+
+    # An event [onset, offset) overlaps a window [start, end) if onset < end and offset > start
+    order = np.argsort(starts, kind="stable")
+    latest_end = np.maximum.accumulate(ends[order]) if len(order) else ends
+    started = np.searchsorted(starts[order], offsets, side="left")  # Windows starting before the offset
+    overlapping = (started > 0) & (latest_end[np.maximum(started - 1, 0)] > onsets) if len(order) else np.zeros(len(events), dtype=bool)
+    logging.info(f"{len(events)} blink events detected, {int((~overlapping).sum())} outside the ground-truth windows")
+
+    return pd.DataFrame({
+        "Gesture": blink_data['Gesture'].tolist(),
+        "Ground_Truth": ground_truth,
+        "Detected_Blink": detected,
+        "Result": results,
+        "Event": matched_events,
+    })
+
+
 def calculate_threshold(filtered_data_dict, blink_data, fs, quantile = 0.6):
     """
     Calculates the threshold for eye blink detection using a modified approach.
@@ -6,10 +6,11 @@ from scipy.fftpack import fft, fftfreq
 import numpy as np
 import re #import regular expression for extracting file names
 from scipy.io import loadmat
-from scipy.signal import butter, filtfilt, zpk2sos, sosfiltfilt
+from scipy.signal import sosfiltfilt
 from scipy.ndimage import binary_dilation
 import concurrent.futures
 from skimage.measure import label
+from filter_design import design_sos
 import sys
 import tkinter as tk
 from tkinter import filedialog
@@ -300,7 +301,7 @@ def band_pass(database_name, Pzplt_data1, Pzplt_data2, Pzplt_data3, Pzplt_data4,
 
     # ========SOS-based design
     #Get second-order sections form
-    sos_FM  = butter(filter_order / 2, np.array([lowCutoff_FM, highCutoff_FM]) / (Fs_sensor / 2), 'bandpass', output='sos')# filter order for bandpass filter is twice the value of 1st parameter
+    sos_FM  = design_sos(filter_order // 2, np.array([lowCutoff_FM, highCutoff_FM]) / (Fs_sensor / 2))# filter order for bandpass filter is twice the value of 1st parameter
 
 
     # -----------------------Digital Data filtering (Bandpass filtering)--------------------------------
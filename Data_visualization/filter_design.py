@@ -0,0 +1,87 @@
+import logging
+from collections import OrderedDict
+import numpy as np
+from scipy.signal import butter, sosfilt_zi
+
+from config import get_filter_cache_size
+
+# (order, band, fs, btype) -> read-only SOS coefficients, least recently used first
+_sos_memo = OrderedDict()
+# Same key -> read-only sosfilt_zi initial state
+_zi_memo = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _filter_key(order, band, fs, btype):
+    """
+    Normalizes the design parameters so equal filters share one entry,
+    e.g. order 5 and 5.0 or band [1, 30] and (1.0, 30.0).
+    """
+    band = tuple(float(f) for f in np.atleast_1d(band))
+    return int(order), band if len(band) > 1 else band[0], None if fs is None else float(fs), btype
+
+
+def _memo_get(memo, key, compute):
+    """
+    Returns a copy of memo[key], computing and inserting it if missing and evicting the least
+    recently used entry beyond get_filter_cache_size(). Copies are returned because scipy's
+    sosfilt rejects read-only coefficients and callers must not alter the shared entry.
+    """
+    if key in memo:
+        memo.move_to_end(key)
+        _stats["hits"] += 1
+        return memo[key].copy()
+
+    _stats["misses"] += 1
+    value = compute()
+    memo[key] = value
+    while len(memo) > get_filter_cache_size():
+        evicted, _ = memo.popitem(last=False)
+        _stats["evictions"] += 1
+        logging.debug(f"Evicted filter design {evicted}")
+    return value.copy()
+
+
+def design_sos(order, band, fs=None, btype='bandpass'):
+    """
+    Designs a Butterworth filter in second-order sections, memoized by (order, band, fs, type).
+
+    Args:
+        order (int): Order passed to butter (a bandpass filter has twice this order).
+        band (float or sequence): Cutoff frequency or [low, high] cutoff frequencies.
+        fs (float): Sampling frequency, or None if band is normalized to the Nyquist frequency.
+        btype (str): 'bandpass', 'lowpass', 'highpass' or 'bandstop'.
+
+    Returns:
+        np.ndarray: SOS coefficients of shape (n_sections, 6).
+    """
+    order, band, fs, btype = key = _filter_key(order, band, fs, btype)
+    return _memo_get(_sos_memo, key, lambda: butter(order, band, btype=btype, fs=fs, output='sos'))
+
+
+def design_sos_zi(order, band, fs=None, btype='bandpass'):
+    """
+    Memoized sosfilt_zi of design_sos: the initial state for a step response of unit amplitude.
+    Scale it by the first sample of a signal to start filtering in steady state.
+
+    Returns:
+        np.ndarray: Initial state of shape (n_sections, 2).
+    """
+    key = _filter_key(order, band, fs, btype)
+    return _memo_get(_zi_memo, key, lambda: sosfilt_zi(design_sos(order, band, fs, btype)))
+
+
+def filter_cache_info():
+    """
+    Returns the hit, miss and eviction counts and the number of cached designs.
+    """
+    return dict(_stats, sos_entries=len(_sos_memo), zi_entries=len(_zi_memo))
+
+
+def clear_filter_cache():
+    """
+    Empties the filter design cache and resets its statistics.
+    """
+    _sos_memo.clear()
+    _zi_memo.clear()
+    _stats.update(hits=0, misses=0, evictions=0)
@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
+from multirate import window_slices, window_bounds
+from orientation import estimate_orientation
+from crossing_index import CrossingIndex
+
 
 def detect_head_movement(gesture_window_data):
     """
@@ -79,6 +83,61 @@ def detect_head_movement(gesture_window_data):
     return None
 
 
+def crosses_back(index, name, first_condition, first_threshold, back_condition, back_threshold, starts, ends):
+    """
+    Finds, in each window, the first sample of a signal crossing one threshold and whether the
+    signal then crosses a second threshold at or after it (e.g. pitch going low, then back up).
+
+    Args:
+        index (CrossingIndex): Crossing index over the signals.
+        name (str): Signal name, e.g. "DAQ_1_p".
+        first_condition (str), first_threshold (float): First crossing, see crossing_index.CONDITIONS.
+        back_condition (str), back_threshold (float): Crossing back.
+        starts (np.ndarray): First sample of each window, see multirate.window_bounds.
+        ends (np.ndarray): End (exclusive) of each window.
+
+    Returns:
+        tuple: (crossed, crossed_back) boolean arrays, one value per window.
+    """
+    first = index.first(name, first_condition, first_threshold, starts, ends)
+    crossed = first >= 0
+    crossed_back = crossed & (index.count(name, back_condition, back_threshold, np.where(crossed, first, ends), ends) > 0)
+    return crossed, crossed_back
+
+def detect_head_movements(index, starts, ends):
+    """
+    Columnar version of detect_head_movement: evaluates every window at once from the threshold
+    crossings of roll, pitch and yaw, with the same conditions and precedence.
+
+    Args:
+        index (CrossingIndex): Crossing index over roll, pitch and yaw (DAQ_1_r, DAQ_1_p, DAQ_1_y).
+        starts (np.ndarray): First sample of each window, see multirate.window_bounds.
+        ends (np.ndarray): End (exclusive) of each window.
+
+    Returns:
+        np.ndarray: 0 for front, 1 for left, 2 for right head movements, -1 if no movement detected.
+    """
+    lengths = ends - starts
+
+    # 1. Front: every sample below the thresholds
+    front = (
+        (index.count("DAQ_1_r", "lt", 0.1, starts, ends) == lengths)
+        & (index.count("DAQ_1_p", "lt", 0.2, starts, ends) == lengths)
+        & (index.count("DAQ_1_y", "lt", 0.1, starts, ends) == lengths)
+    )
+
+    # 2. Left: roll >= 0 somewhere, and pitch low then back up, yaw high then back down, or pitch low and yaw high
+    pitch_low, pitch_low_then_high = crosses_back(index, "DAQ_1_p", "le", -0.2, "ge", 0.2, starts, ends)
+    yaw_high, yaw_high_then_low = crosses_back(index, "DAQ_1_y", "ge", 0.08, "le", -0.08, starts, ends)
+    left = (index.count("DAQ_1_r", "ge", 0, starts, ends) > 0) & (pitch_low_then_high | yaw_high_then_low | (pitch_low & yaw_high))
+
+    # 3. Right: roll <= -0.1 somewhere, and pitch high then back down, yaw low then back up, or pitch high and yaw low
+    pitch_high, pitch_high_then_low = crosses_back(index, "DAQ_1_p", "ge", 0.2, "le", -0.2, starts, ends)
+    yaw_low, yaw_low_then_high = crosses_back(index, "DAQ_1_y", "le", -0.08, "ge", 0.08, starts, ends)
+    right = (index.count("DAQ_1_r", "le", -0.1, starts, ends) > 0) & (pitch_high_then_low | yaw_low_then_high | (pitch_high & yaw_low))
+
+    return np.select([front, left, right], [0, 1, 2], -1)
+
 
 def extract_gesture_data(filtered_data_dict, start_time, end_time, fs):
     """
@@ -97,17 +156,31 @@ def extract_gesture_data(filtered_data_dict, start_time, end_time, fs):
     start_index = int(start_time * fs)
     end_index = int(end_time * fs)
     
+    return slice_gesture_data(filtered_data_dict, slice(start_index, end_index))
+
+def slice_gesture_data(filtered_data_dict, window):
+    """
+    Takes the IMU data of a gesture window given as a slice of sample indices.
+
+    Args:
+        filtered_data_dict (dict): Contains roll, pitch, yaw arrays.
+        window (slice): Sample window, e.g. from multirate.window_slices.
+
+    Returns:
+        gesture_window_data (dict): Contains windowed IMU data for the gesture.
+    """
     gesture_window_data = {
-        "roll": filtered_data_dict["DAQ_1_r"][start_index:end_index],
-        "pitch": filtered_data_dict["DAQ_1_p"][start_index:end_index],
-        "yaw": filtered_data_dict["DAQ_1_y"][start_index:end_index],
+        "roll": filtered_data_dict["DAQ_1_r"][window],
+        "pitch": filtered_data_dict["DAQ_1_p"][window],
+        "yaw": filtered_data_dict["DAQ_1_y"][window],
     }
     
     return gesture_window_data
 
-def process_gestures(filtered_data_dict, gesture_data, pitch_threshold, yaw_threshold_right, yaw_threshold_left, fs, min_count=32):
+def process_gestures(filtered_data_dict, gesture_data, pitch_threshold, yaw_threshold_right, yaw_threshold_left, fs, min_count=32, engine=None, sensor_data=None, index=None, windows=None):
     """
     Processes a list of gestures and applies the movement detection for each gesture window.
+    All windows are evaluated at once, see detect_head_movements.
     
     Args:
         filtered_data_dict (dict): Contains roll, pitch, yaw arrays.
@@ -117,20 +190,50 @@ def process_gestures(filtered_data_dict, gesture_data, pitch_threshold, yaw_thre
         yaw_threshold_left (float): Threshold for detecting left head movement.
         fs (float): Sampling frequency of the sensor (samples per second).
         min_count (int): Minimum number of samples that must exceed the threshold to detect a gesture.
+        engine (str): Optional orientation engine (see orientation.ORIENTATION_ENGINES) to compute roll, pitch,
+                      and yaw from sensor_data with, instead of using those in filtered_data_dict.
+        sensor_data (dict): IMU sensor data of DAQ 1, required with engine.
+        index (CrossingIndex): Crossing index over filtered_data_dict, to reuse across calls
+                               (built if None; not used with engine).
+        windows (np.ndarray): Window indices at fs computed beforehand, e.g. mapped from the MMG
+                              windows with multirate.map_index (see multirate.window_indices).
 
     Returns:
         results (pd.DataFrame): DataFrame containing gesture, detected movements, and comparison with ground truth.
     """
+    if engine is not None:
+        rpy_data = estimate_orientation(sensor_data, fs, engine)
+        filtered_data_dict = {"DAQ_1_r": rpy_data[:, 0], "DAQ_1_p": rpy_data[:, 1], "DAQ_1_y": rpy_data[:, 2]}
+        index = None
+    if index is None:
+        index = CrossingIndex(filtered_data_dict)
+
+    starts, ends = window_bounds(gesture_data, fs, len(filtered_data_dict["DAQ_1_r"]), windows)
+    detected = detect_head_movements(index, starts, ends)
+    ground_truth = gesture_data['Head_movement'].to_numpy()
+    result = np.where(detected < 0, "No Movement Detected", np.where(detected == ground_truth, "Match", "No Match"))
+
+    return pd.DataFrame({
+        "Gesture": gesture_data['Gesture'].tolist(),
+        "Ground_Truth": ground_truth.tolist(),
+        "Detected_Movement": [None if movement < 0 else movement for movement in detected.tolist()],
+        "Result": result.tolist(),
+    })
+
+def process_gestures_rowwise(filtered_data_dict, gesture_data, pitch_threshold, yaw_threshold_right, yaw_threshold_left, fs, min_count=32):
+    """
+    Row-by-row reference implementation of process_gestures using detect_head_movement on each window.
+    """
     results = []
+    # Sample windows of all gestures, computed once
+    windows = window_slices(gesture_data, fs)
     
-    for i, row in gesture_data.iterrows():
-        start_time = row['Pressed']
-        end_time = row['Released']
+    for (i, row), window in zip(gesture_data.iterrows(), windows):
         gesture_name = row['Gesture']
         ground_truth = row['Head_movement']  # 0: front, 1: left, 2: right
         
         # Extract gesture window data based on the time window from the Excel file
-        gesture_window_data = extract_gesture_data(filtered_data_dict, start_time, end_time, fs)
+        gesture_window_data = slice_gesture_data(filtered_data_dict, window)
         
         # Detect movements with the updated condition
         detected_movement = detect_head_movement(gesture_window_data)
@@ -0,0 +1,232 @@
+import argparse
+import json
+import logging
+import os
+from datetime import datetime
+import numpy as np
+
+# Column blocks of the (N, 9) measurement matrix, see kalman_filter.imu_measurements
+ACC_COLUMNS = slice(0, 3)
+GYRO_COLUMNS = slice(3, 6)
+MAG_COLUMNS = slice(6, 9)
+
+
+def identity_calibration():
+    """
+    Returns the calibration that leaves the measurements unchanged.
+    """
+    return {"offset": np.zeros(9), "matrix": np.eye(9), "info": {}}
+
+
+def rest_mask(measurements, fs_imu, window_s=1.0, quantile=0.1, factor=2.0):
+    """
+    Finds the rest periods of a session: windows whose gyroscope and accelerometer spread is
+    close to the quietest windows of the session.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (N, 9), see kalman_filter.imu_measurements.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        window_s (float): Length of the windows in seconds.
+        quantile (float): Quantile of the window spreads taken as the noise floor.
+        factor (float): Windows up to factor times the noise floor count as rest.
+
+    Returns:
+        np.ndarray: Boolean array of shape (N,), True for samples in rest windows.
+    """
+    window = max(int(window_s * fs_imu), 2)
+    num_windows = len(measurements) // window
+    mask = np.zeros(len(measurements), dtype=bool)
+    if num_windows == 0:
+        return mask
+
+    windows = measurements[:num_windows * window].reshape(num_windows, window, 9)
+    spread = windows.std(axis=1)  # (num_windows, 9)
+    gyro_spread = spread[:, GYRO_COLUMNS].sum(axis=1)
+    acc_spread = spread[:, ACC_COLUMNS].sum(axis=1)
+    at_rest = (gyro_spread <= factor * np.quantile(gyro_spread, quantile)) & (acc_spread <= factor * np.quantile(acc_spread, quantile))
+
+    mask[:num_windows * window] = np.repeat(at_rest, window)
+    return mask
+
+
+def fit_ellipsoid(points, max_axis_ratio=2.0, min_spread=0.2, max_residual=0.1):
+    """
+    Least-squares fit of an ellipsoid x^T A x + b^T x = 1 to 3-D points, returned as the affine
+    map that sends it to a sphere of the same mean radius: corrected = matrix @ (x - center).
+    Used for the hard- and soft-iron correction of the magnetometer and the offset and scale
+    of the accelerometer.
+
+    The fit needs the points to cover the surface of the ellipsoid. It is rejected (None) when the
+    points lie in a small patch (spread along the weakest direction below min_spread times the
+    radius), fill a volume rather than a surface (e.g. sensor noise around a single orientation,
+    radial spread above max_residual times the radius), or when the result is not an ellipsoid or
+    is more elongated than max_axis_ratio.
+
+    Args:
+        points (np.ndarray): Points of shape (N, 3).
+        max_axis_ratio (float): Largest accepted ratio between the longest and shortest axis.
+        min_spread (float): Smallest accepted standard deviation along any direction, relative to the radius.
+        max_residual (float): Largest accepted standard deviation of the corrected radius, relative to the radius.
+
+    Returns:
+        tuple: (center, matrix) with shapes (3,) and (3, 3), or None if the fit is rejected.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 9:
+        return None
+
+    # Solve for the 9 quadric coefficients, centered and scaled for conditioning
+    mean = points.mean(axis=0)
+    scale = np.sqrt(np.mean(np.sum((points - mean) ** 2, axis=1)))
+    if scale == 0:
+        return None
+    x, y, z = ((points - mean) / scale).T
+    design = np.column_stack((x * x, y * y, z * z, 2 * x * y, 2 * x * z, 2 * y * z, 2 * x, 2 * y, 2 * z))
+    coefficients, *_ = np.linalg.lstsq(design, np.ones(len(points)), rcond=None)
+    a, b, c, d, e, f, g, h, i = coefficients
+    A = np.array([[a, d, e], [d, b, f], [e, f, c]])
+    linear = 2 * np.array([g, h, i])
+
+    try:
+        center = -0.5 * np.linalg.solve(A, linear)
+    except np.linalg.LinAlgError:
+        return None
+    shape = A / (1 + center @ A @ center)  # (x - center)^T shape (x - center) = 1
+    eigenvalues, eigenvectors = np.linalg.eigh(shape)
+    if np.any(eigenvalues <= 0):
+        return None
+    axes = 1 / np.sqrt(eigenvalues)
+    if axes.max() / axes.min() > max_axis_ratio:
+        return None
+
+    radius = np.prod(axes) ** (1 / 3)
+    spread = np.sqrt(np.linalg.eigvalsh(np.cov(((points - mean) / scale).T)))
+    if spread.min() < min_spread * radius:
+        return None
+
+    whitening = eigenvectors @ np.diag(np.sqrt(eigenvalues)) @ eigenvectors.T
+    radial = np.linalg.norm((np.column_stack((x, y, z)) - center) @ whitening.T, axis=1)
+    if radial.std() > max_residual:
+        return None
+
+    # Back to the units of the points: whiten to the unit sphere, then scale to the mean radius
+    return mean + scale * center, whitening * radius
+
+
+def estimate_calibration(measurements, fs_imu, **rest_args):
+    """
+    Estimates the calibration of one headband from a session:
+    - gyroscope bias: mean rate over the rest periods;
+    - accelerometer offset and scale: ellipsoid fit of the rest samples, which only see gravity;
+    - magnetometer hard- and soft-iron correction: ellipsoid fit of all samples.
+    Fits rejected by fit_ellipsoid (e.g. too few orientations in the session) leave that sensor uncorrected.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (N, 9), see kalman_filter.imu_measurements.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        **rest_args: Arguments of rest_mask.
+
+    Returns:
+        dict: "offset" (9,) and "matrix" (9, 9) of the affine correction (see apply_calibration),
+              and "info" describing what was estimated.
+    """
+    measurements = np.asarray(measurements, dtype=np.float64)
+    at_rest = rest_mask(measurements, fs_imu, **rest_args)
+    if at_rest.sum() < 2 * fs_imu:
+        raise ValueError(f"Only {at_rest.sum()} rest samples found, at least {2 * fs_imu} are needed for calibration")
+
+    calibration = identity_calibration()
+    calibration["offset"][GYRO_COLUMNS] = measurements[at_rest, GYRO_COLUMNS].mean(axis=0)
+    info = {"samples": len(measurements), "rest_samples": int(at_rest.sum()), "gyro": "bias"}
+
+    for name, columns, points in (("acc", ACC_COLUMNS, measurements[at_rest, ACC_COLUMNS]), ("mag", MAG_COLUMNS, measurements[:, MAG_COLUMNS])):
+        fit = fit_ellipsoid(points)
+        if fit is None:
+            logging.info(f"{name} ellipsoid fit rejected, {name} left uncorrected")
+            info[name] = "none"
+            continue
+        calibration["offset"][columns], calibration["matrix"][columns, columns] = fit
+        info[name] = "ellipsoid"
+
+    calibration["info"] = info
+    return calibration
+
+
+def apply_calibration(measurements, calibration):
+    """
+    Applies a calibration to measurements as one affine transform: (measurements - offset) @ matrix.T.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (..., 9), see kalman_filter.imu_measurements.
+        calibration (dict): Calibration from estimate_calibration or load_calibration.
+
+    Returns:
+        np.ndarray: Calibrated measurements in the float type of the input.
+    """
+    dtype = np.result_type(measurements, np.float32)
+    offset = np.asarray(calibration["offset"], dtype=dtype)
+    matrix = np.asarray(calibration["matrix"], dtype=dtype)
+    return (measurements - offset) @ matrix.T
+
+
+def calibration_path(calibration_dir, headband_id):
+    """
+    Returns the file holding the calibration of a headband.
+    """
+    return os.path.join(calibration_dir, f"{headband_id}.json")
+
+
+def save_calibration(calibration_dir, headband_id, calibration):
+    """
+    Stores the calibration of a headband as JSON, replacing any previous one.
+    """
+    os.makedirs(calibration_dir, exist_ok=True)
+    record = {
+        "headband_id": headband_id,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "offset": np.asarray(calibration["offset"]).tolist(),
+        "matrix": np.asarray(calibration["matrix"]).tolist(),
+        "info": calibration.get("info", {}),
+    }
+    path = calibration_path(calibration_dir, headband_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"Calibration of headband {headband_id} saved to {path}")
+
+
+def load_calibration(calibration_dir, headband_id):
+    """
+    Loads the stored calibration of a headband.
+
+    Returns:
+        dict: Calibration with "offset", "matrix" and "info", or None if the headband has none.
+    """
+    if headband_id is None:
+        return None
+    path = calibration_path(calibration_dir, headband_id)
+    if not os.path.exists(path):
+        logging.info(f"No calibration stored for headband {headband_id} in {calibration_dir}")
+        return None
+    with open(path) as f:
+        record = json.load(f)
+    return {"offset": np.array(record["offset"]), "matrix": np.array(record["matrix"]), "info": record.get("info", {})}
+
+
+if __name__ == "__main__":
+    from config import get_daq_file_paths, get_fs_MMG_sensor, get_fs_IMU_sensor, get_headband_id, get_calibration_dir
+    from daq_processing import process_daq_data
+    from kalman_filter import imu_measurements
+
+    parser = argparse.ArgumentParser(description="Estimate and store the IMU calibration of a headband from a DAQ1 recording.")
+    parser.add_argument("--daq-file", default=get_daq_file_paths()[0], help="DAQ1 recording (with IMU) to calibrate from")
+    parser.add_argument("--headband-id", default=get_headband_id(), required=get_headband_id() is None, help="Headband to store the calibration for")
+    parser.add_argument("--calibration-dir", default=get_calibration_dir(), help="Directory of the calibration store")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sensor_data, _ = process_daq_data(args.daq_file, get_fs_MMG_sensor(), calculate_trailing_zeros=True)
+    calibration = estimate_calibration(imu_measurements(sensor_data), get_fs_IMU_sensor())
+    save_calibration(args.calibration_dir, args.headband_id, calibration)
+    print(json.dumps(calibration["info"], indent=2))
@@ -1,6 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from filterpy.kalman import KalmanFilter
+from scipy.linalg import solve_discrete_are
+from scipy.signal import lfilter, ss2tf
 import os
 import logging
 
@@ -70,19 +72,164 @@ def ekf_update(ekf, accel, gyro, mag):
     # Return the estimated roll, pitch, and yaw
     return ekf.x[:3]  # Return roll, pitch, yaw
 
-def imu_to_roll_pitch_yaw_ekf(sensor_data, fs_imu, database_name):
+class OrientationKalmanFilter:
     """
-    Convert 9-axis IMU data into roll, pitch, and yaw using Kalman filter and visualize the results.
+    Orientation filter of initialize_ekf with the filterpy predict/update equations evaluated in
+    place on preallocated buffers, so filtering a recording allocates no arrays per sample.
+    The results are bit-for-bit identical to calling ekf_update on each sample.
+
+    The covariance and gain do not depend on the measurements. Once the posterior covariance
+    stops changing (a floating-point fixed point, reached after about 45 samples) the gain is
+    frozen and only the state is updated.
+    """
+    __slots__ = ("F", "H", "Q", "R", "x", "P", "K", "converged", "_I", "_x_prior", "_hx", "_y", "_ky",
+                 "_P_prior", "_FP", "_FPF", "_PHT", "_S", "_KH", "_I_KH", "_I_KH_P", "_P_post", "_KR", "_KRK")
+
+    def __init__(self, fs_imu):
+        """
+        Args:
+            fs_imu (int): Sampling frequency of the IMU.
+        """
+        ekf = initialize_ekf(fs_imu)
+        self.F, self.H, self.Q, self.R = ekf.F, ekf.H, ekf.Q, ekf.R
+        dim_z, dim_x = self.H.shape
+        self._I = np.eye(dim_x)
+        self.x = np.empty(dim_x)
+        self.P = np.empty((dim_x, dim_x))
+        self.K = np.empty((dim_x, dim_z))
+        self._x_prior = np.empty(dim_x)
+        self._hx = np.empty(dim_z)
+        self._y = np.empty(dim_z)
+        self._ky = np.empty(dim_x)
+        self._P_prior = np.empty((dim_x, dim_x))
+        self._FP = np.empty((dim_x, dim_x))
+        self._FPF = np.empty((dim_x, dim_x))
+        self._PHT = np.empty((dim_x, dim_z))
+        self._S = np.empty((dim_z, dim_z))
+        self._KH = np.empty((dim_x, dim_x))
+        self._I_KH = np.empty((dim_x, dim_x))
+        self._I_KH_P = np.empty((dim_x, dim_x))
+        self._P_post = np.empty((dim_x, dim_x))
+        self._KR = np.empty((dim_x, dim_z))
+        self._KRK = np.empty((dim_x, dim_x))
+        self.reset(ekf.x, ekf.P)
+
+    def reset(self, x=None, P=None):
+        """
+        Restarts the filter from a state and covariance (default: those of initialize_ekf).
+        """
+        self.x[:] = 0.0 if x is None else x
+        self.P[:] = self._I if P is None else P
+        self.converged = False
+
+    def _update_covariance(self):
+        """
+        Covariance part of predict/update, same operation order as filterpy. Returns whether
+        the posterior covariance is unchanged from the previous sample.
+        """
+        np.dot(self.F, self.P, out=self._FP)
+        np.dot(self._FP, self.F.T, out=self._FPF)
+        np.add(self._FPF, self.Q, out=self._P_prior)
+
+        np.dot(self._P_prior, self.H.T, out=self._PHT)
+        np.dot(self.H, self._PHT, out=self._S)
+        np.add(self._S, self.R, out=self._S)
+        np.dot(self._PHT, np.linalg.inv(self._S), out=self.K)
+
+        np.dot(self.K, self.H, out=self._KH)
+        np.subtract(self._I, self._KH, out=self._I_KH)
+        np.dot(self._I_KH, self._P_prior, out=self._I_KH_P)
+        np.dot(self._I_KH_P, self._I_KH.T, out=self._P_post)
+        np.dot(self.K, self.R, out=self._KR)
+        np.dot(self._KR, self.K.T, out=self._KRK)
+        np.add(self._P_post, self._KRK, out=self._P_post)
+
+        unchanged = np.array_equal(self._P_post, self.P)
+        self.P[:] = self._P_post
+        return unchanged
+
+    def filter(self, measurements, out=None):
+        """
+        Filters all measurements, continuing from the current state.
+
+        Args:
+            measurements (np.ndarray): Measurements of shape (N, 9), see imu_measurements.
+            out (np.ndarray): Optional float64 array of shape (N, 6) to write the states to.
+
+        Returns:
+            np.ndarray: Posterior states [roll, pitch, yaw, roll_rate, pitch_rate, yaw_rate] of shape (N, 6).
+        """
+        if out is None:
+            out = np.empty((len(measurements), len(self.x)))
+        F, H, K = self.F, self.H, self.K
+        x, x_prior, hx, y, ky = self.x, self._x_prior, self._hx, self._y, self._ky
+
+        for t in range(len(measurements)):
+            if not self.converged:
+                self.converged = self._update_covariance()
+            np.dot(F, x, out=x_prior)
+            np.dot(H, x_prior, out=hx)
+            np.subtract(measurements[t], hx, out=y)
+            np.dot(K, y, out=ky)
+            np.add(x_prior, ky, out=x)
+            out[t] = x
+
+        return out
+
+    def filter_batch(self, measurements, out=None):
+        """
+        Filters a batch of sessions in lockstep, each starting from the current state. The gain
+        does not depend on the data, so one covariance update per time step serves every session
+        and the state update is a matrix product across the session axis.
+
+        Args:
+            measurements (np.ndarray): Measurements of shape (S, N, 9), shorter sessions padded at the end.
+            out (np.ndarray): Optional float64 array of shape (S, N, 6) to write the states to.
+
+        Returns:
+            np.ndarray: Posterior states of shape (S, N, 6). Samples past the end of a session are
+                        filtered like the padding and should be ignored.
+        """
+        num_sessions, num_samples = measurements.shape[:2]
+        dim_z, dim_x = self.H.shape
+        if out is None:
+            out = np.empty((num_sessions, num_samples, dim_x))
+        F_T, H_T, K_T = self.F.T, self.H.T, self.K.T
+        x = np.empty((num_sessions, dim_x))
+        x[:] = self.x
+        x_prior = np.empty((num_sessions, dim_x))
+        hx = np.empty((num_sessions, dim_z))
+        y = np.empty((num_sessions, dim_z))
+        ky = np.empty((num_sessions, dim_x))
+        converged, P, K = self.converged, self.P.copy(), self.K.copy()
+
+        for t in range(num_samples):
+            if not self.converged:
+                self.converged = self._update_covariance()
+            np.dot(x, F_T, out=x_prior)
+            np.dot(x_prior, H_T, out=hx)
+            np.subtract(measurements[:, t], hx, out=y)
+            np.dot(y, K_T, out=ky)
+            np.add(x_prior, ky, out=x)
+            out[:, t] = x
+
+        # Sessions are independent, so the filter's own state is left as it was
+        self.converged = converged
+        self.P[:] = P
+        self.K[:] = K
+        return out
+
+def imu_measurements(sensor_data):
+    """
+    Stacks the accelerometer, gyroscope, and magnetometer data into the measurement vectors of the filter,
+    trimmed to the shortest channel.
 
     Args:
         sensor_data (dict): Dictionary containing IMU sensor data in time series format for Aclm, Gyro, and Mag.
-        fs_imu (int): Sampling frequency of the IMU sensors.
-        database_name (str): Name of the database to save the visualizations.
 
     Returns:
-        np.ndarray: Numpy array with shape (N, 3), where N is the number of time points and 3 corresponds to roll, pitch, and yaw.
+        np.ndarray: Array of shape (N, 9) with columns [ax, ay, az, gx, gy, gz, mx, my, mz].
     """
- 
     # Extract and trim accelerometer data to the shortest length across X, Y, Z axes
     acc_len = min(len(sensor_data["Aclm_X"]), len(sensor_data["Aclm_Y"]), len(sensor_data["Aclm_Z"]))
     acc_data = np.vstack([sensor_data["Aclm_X"][:acc_len], sensor_data["Aclm_Y"][:acc_len], sensor_data["Aclm_Z"][:acc_len]]).T  # Shape: (N, 3)
@@ -102,21 +249,138 @@ def imu_to_roll_pitch_yaw_ekf(sensor_data, fs_imu, database_name):
     gyro_data = gyro_data[:min_length]
     mag_data = mag_data[:min_length]
 
-    # Initialize EKF
-    ekf = initialize_ekf(fs_imu)
+    return np.hstack((acc_data, gyro_data, mag_data))
 
-    num_samples = acc_data.shape[0]
-    rpy_data = np.zeros((num_samples, 3))  # Array to store roll, pitch, yaw values for each time step
+def steady_state_gain(ekf):
+    """
+    Solves the discrete algebraic Riccati equation of a time-invariant Kalman filter for the
+    gain that its time-varying gain converges to.
 
-    # Apply EKF to each time step of IMU data
-    for t in range(num_samples):
-        roll, pitch, yaw = ekf_update(ekf, acc_data[t], gyro_data[t], mag_data[t])
-        rpy_data[t, 0] = roll
-        rpy_data[t, 1] = pitch
-        rpy_data[t, 2] = yaw
+    Args:
+        ekf (KalmanFilter): Filter from initialize_ekf (only F, H, Q and R are used).
 
-    # =================== Visualization and Saving ===================
-    time_vector = np.arange(num_samples) / fs_imu  # Create time vector
+    Returns:
+        K (np.ndarray): Steady-state Kalman gain of shape (dim_x, dim_z).
+        P (np.ndarray): Steady-state predicted state covariance of shape (dim_x, dim_x).
+    """
+    P = solve_discrete_are(ekf.F.T, ekf.H.T, ekf.Q, ekf.R)
+    S = ekf.H @ P @ ekf.H.T + ekf.R
+    K = np.linalg.solve(S, ekf.H @ P).T  # P H^T S^-1, with S symmetric
+    return K, P
+
+def kalman_steady_state(ekf, measurements, transient=True, tol=1e-13):
+    """
+    Runs a time-invariant Kalman filter over all measurements as a linear recursion with the
+    steady-state gain K: x[k] = (I - K H) F x[k-1] + K z[k]. Each output is computed by lfilter
+    from the state-space form of that recursion instead of a predict/update loop.
+
+    With transient=True the first samples are filtered with the exact time-varying gain (the
+    same equations as KalmanFilter.predict/update) until it is within tol of K, so the output
+    matches the predict/update loop to about tol. Otherwise K is used from the first sample.
+
+    Args:
+        ekf (KalmanFilter): Filter from initialize_ekf, with its initial x and P.
+        measurements (np.ndarray): Measurements of shape (N, dim_z).
+        transient (bool): Whether to filter the start-up transient exactly.
+        tol (float): Largest gain difference at which the transient counts as converged.
+
+    Returns:
+        np.ndarray: Posterior state estimates of shape (N, dim_x).
+    """
+    F, H, Q, R = ekf.F, ekf.H, ekf.Q, ekf.R
+    K, _ = steady_state_gain(ekf)
+    num_samples, dim_x = len(measurements), len(ekf.x)
+    states = np.empty((num_samples, dim_x))
+
+    x = np.array(ekf.x, dtype=float).reshape(dim_x)
+    P = np.array(ekf.P, dtype=float)
+    n_exact = 0
+    I = np.eye(dim_x)
+    while transient and n_exact < num_samples:
+        # Predict and update with the time-varying gain
+        x = F @ x
+        P = F @ P @ F.T + Q
+        S = H @ P @ H.T + R
+        K_t = np.linalg.solve(S, H @ P).T
+        x = x + K_t @ (measurements[n_exact] - H @ x)
+        I_KH = I - K_t @ H
+        P = I_KH @ P @ I_KH.T + K_t @ R @ K_t.T
+        states[n_exact] = x
+        n_exact += 1
+        if np.max(np.abs(K_t - K)) < tol:
+            break
+
+    remaining = measurements[n_exact:]
+    if len(remaining) == 0:
+        return states
+
+    # With s[k] = x[k-1]: s[k+1] = A s[k] + K z[k] and x[k] = A s[k] + K z[k]. All transfer
+    # functions share the denominator det(zI - A), so the numerators are applied as one FIR
+    # (a matrix product per lag) and the denominator as one lfilter over all states.
+    A = (I - K @ H) @ F
+    numerators = np.stack([ss2tf(A, K, A, K, input=j)[0] for j in range(K.shape[1])])  # (dim_z, dim_x, order + 1)
+    denominator = np.poly(A)
+    steady = np.zeros((len(remaining), dim_x))
+    for lag in range(numerators.shape[2]):
+        steady[lag:] += remaining[:len(remaining) - lag] @ numerators[:, :, lag]
+    steady = lfilter([1.0], denominator, steady, axis=0)
+
+    # Add the response to the state at the switch, which decays geometrically
+    free = A @ x
+    for k in range(len(remaining)):
+        steady[k] += free
+        free = A @ free
+        if not np.any(np.abs(free) > 1e-18 * (np.max(np.abs(x)) + 1e-300)):
+            break
+
+    states[n_exact:] = steady
+    return states
+
+def imu_to_roll_pitch_yaw_ekf(sensor_data, fs_imu, database_name, render=True, steady_state=False, transient=True):
+    """
+    Convert 9-axis IMU data into roll, pitch, and yaw using Kalman filter and visualize the results.
+
+    Args:
+        sensor_data (dict): Dictionary containing IMU sensor data in time series format for Aclm, Gyro, and Mag.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        database_name (str): Name of the database to save the visualizations.
+        render (bool): Whether to save the figure (see plot_roll_pitch_yaw). Pipelines pass False and render separately.
+        steady_state (bool): Whether to use the vectorized steady-state filter (see kalman_steady_state)
+                             instead of the per-sample predict/update loop.
+        transient (bool): With steady_state, whether to filter the start-up transient exactly.
+
+    Returns:
+        np.ndarray: Numpy array with shape (N, 3), where N is the number of time points and 3 corresponds to roll, pitch, and yaw.
+    """
+ 
+    measurements = imu_measurements(sensor_data)
+    if steady_state:
+        states = kalman_steady_state(initialize_ekf(fs_imu), measurements, transient)
+        rpy_data = states[:, :3].astype(np.result_type(measurements, np.float32))
+        if render:
+            plot_roll_pitch_yaw(database_name, rpy_data, fs_imu)
+        return rpy_data
+
+    # Apply the filter to each time step of IMU data (same results as ekf_update per sample)
+    states = OrientationKalmanFilter(fs_imu).filter(measurements)
+    rpy_data = states[:, :3].astype(np.result_type(measurements, np.float32))  # Roll, pitch, yaw (float32 for float32 input)
+
+    if render:
+        plot_roll_pitch_yaw(database_name, rpy_data, fs_imu)
+
+    return rpy_data
+
+
+def plot_roll_pitch_yaw(database_name, rpy_data, fs_imu):
+    """
+    Saves the roll, pitch, and yaw of imu_to_roll_pitch_yaw_ekf to ./visual.
+
+    Args:
+        database_name (str): Name of the database for saving visualizations.
+        rpy_data (np.ndarray): Array of shape (N, 3) holding roll, pitch, and yaw.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+    """
+    time_vector = np.arange(len(rpy_data)) / fs_imu  # Create time vector
 
     # Create output directory if it doesn't exist
     os.makedirs('visual', exist_ok=True)
@@ -149,8 +413,6 @@ def imu_to_roll_pitch_yaw_ekf(sensor_data, fs_imu, database_name):
 
     # Save the figure
     plt.savefig(f'./visual/{database_name}_roll_pitch_yaw_ekf.png', dpi=300)
-    plt.clf()
+    plt.close(fig)
 
     logging.info(f"Roll, pitch, and yaw visualization saved as {database_name}_roll_pitch_yaw_ekf.png")
-
-    return rpy_data
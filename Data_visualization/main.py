@@ -1,14 +1,17 @@
 import logging
 import os
-from daq_processing import process_multiple_daqs
 from visualization import visualize_sensor_data
-from config import get_daq_file_paths, get_fs_MMG_sensor, get_fs_IMU_sensor, get_excel_file_path
-from band_pass_filter import band_pass
-from kalman_filter import imu_to_roll_pitch_yaw_ekf
+from config import get_daq_file_paths, get_fs_MMG_sensor, get_fs_IMU_sensor, get_excel_file_path, get_cache_dir, get_cache_max_bytes, get_daq_alignment, get_render_mode, get_render_workers, get_signal_dtype, get_orientation_engine, get_headband_id, get_calibration_dir, get_blink_events
+from band_pass_filter import plot_filtered_mmg
+from kalman_filter import plot_roll_pitch_yaw
+from render_queue import RenderQueue
+from imu_calibration import load_calibration
+from multirate import window_indices, map_index
+from session_cache import SessionCache, cached_process_multiple_daqs, cached_band_pass_mmg_batch, cached_orientation
 import pandas as pd
 from datetime import timedelta, datetime, time
 from head_movement import load_gesture_data_from_excel, process_gestures, plot_imu_data
-from eye_blink_v2 import process_eye_blinks, plot_mmg_data, calculate_threshold
+from eye_blink_v2 import process_eye_blinks, detect_blink_events, match_blink_events, plot_mmg_data, calculate_threshold
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,6 +20,8 @@ def main():
     """
     Main function to orchestrate DAQ processing and visualization.
     """
+    # Figures are rendered separately from the DSP stages: inline, in background processes, or not at all
+    render_queue = RenderQueue(get_render_mode(), get_render_workers())
     try:
         # Get DAQ file paths from config
         daq_file_paths = get_daq_file_paths()
@@ -30,8 +35,13 @@ def main():
         fs_imu = get_fs_IMU_sensor()
 
 
+        # Converted, filtered and EKF arrays are reused across runs while the DAQ files are unchanged
+        cache = SessionCache(get_cache_dir(), get_cache_max_bytes())
+
         # Process DAQs
-        sensor_data_list = process_multiple_daqs(daq_file_paths, fs_mmg)
+        alignment = get_daq_alignment()
+        dtype = get_signal_dtype()
+        sensor_data_list = cached_process_multiple_daqs(cache, daq_file_paths, fs_mmg, alignment, dtype)
 
         # Visualize the sensor data
         # for i, sensor_data in enumerate(sensor_data_list):
@@ -46,14 +56,13 @@ def main():
         # Dictionary to hold the filtered MMG data for each sensor in each DAQ
         filtered_data_dict = {}
 
-        # Apply bandpass filter for each DAQ's MMG data
-        for i, sensor_data in enumerate(sensor_data_list):
+        # Apply bandpass filter to the MMG data of all DAQs at once
+        filtered_mmg_list = cached_band_pass_mmg_batch(cache, daq_file_paths, sensor_data_list, low_cutoff, high_cutoff, fs_mmg, alignment=alignment, dtype=dtype)
+        for i, filtered_mmg_data in enumerate(filtered_mmg_list):
             daq_label = f"DAQ_{i+1}"
-            
-            # Pass the entire MMG data (A0 to A7) to the band_pass function
-            filtered_mmg_data, _ = band_pass(daq_label, sensor_data, low_cutoff, high_cutoff, fs_mmg, fs_imu)
-            
-            # Filtered MMG data is expected to be a list with 8 arrays corresponding to A0 to A5
+            render_queue.submit(plot_filtered_mmg, daq_label, filtered_mmg_data, fs_mmg)
+
+            # Filtered MMG data is a (6, N) array corresponding to A0 to A5
             sensor_names = ["A0", "A1", "A2", "A3", "A4", "A5"]
             # A0 = accelerometer RMS, A1 to A5 = piezo sensors
             
@@ -62,11 +71,14 @@ def main():
                 key = f"{daq_label}_{sensor_name}"
                 filtered_data_dict[key] = filtered_mmg_data[j]
 
-        # kalman filter 
-        IMU_RPY_data = imu_to_roll_pitch_yaw_ekf(sensor_data_list[0], fs_imu, "DAQ_1")
+        # Roll, pitch and yaw from the orientation engine set by ORIENTATION_ENGINE (default: Kalman filter)
+        # IMU bias and hard/soft-iron correction stored for the headband (see imu_calibration.py), if any
+        calibration = load_calibration(get_calibration_dir(), get_headband_id())
+        IMU_RPY_data = cached_orientation(cache, daq_file_paths, sensor_data_list[0], fs_imu, get_orientation_engine(), dtype, calibration)
         filtered_data_dict["DAQ_1_r"] = IMU_RPY_data[:, 0]
         filtered_data_dict["DAQ_1_p"] = IMU_RPY_data[:, 1]
         filtered_data_dict["DAQ_1_y"] = IMU_RPY_data[:, 2]
+        render_queue.submit(plot_roll_pitch_yaw, "DAQ_1", IMU_RPY_data, fs_imu)
 
         # Define thresholds for detecting gestures based on IMU data
         PITCH_THRESHOLD = 0.4  # Front head movement
@@ -79,6 +91,9 @@ def main():
         # excel_file_path = "./modified_gesture_data_in_seconds.xlsx"
         excel_file_path = get_excel_file_path()
         gesture_data = load_gesture_data_from_excel(excel_file_path)
+        # Gesture windows converted to sample indices once at the MMG rate and mapped to the IMU rate
+        mmg_windows = window_indices(gesture_data, fs_mmg)
+        imu_windows = map_index(mmg_windows, fs_mmg, fs_imu)
         MIN_COUNT = 5  # Minimum number of values above threshold to detect a gesture
         # Process the gestures
         results = process_gestures(
@@ -88,14 +103,16 @@ def main():
             YAW_THRESHOLD_RIGHT, 
             YAW_THRESHOLD_LEFT,
             fs_imu,
-            MIN_COUNT  # Minimum number of samples above threshold for detection
+            MIN_COUNT,  # Minimum number of samples above threshold for detection
+            windows=imu_windows
         )
 
         # Print the results
         print(results)
 
         # Call the plotting function
-        plot_imu_data(
+        render_queue.submit(
+            plot_imu_data,
             filtered_data_dict, 
             gesture_data, 
             PITCH_THRESHOLD, 
@@ -113,7 +130,8 @@ def main():
         # Calc eye blink threshold
         threshold_daq1, threshold_daq2 = calculate_threshold(filtered_data_dict, blink_data, fs_mmg, quantile = 0.6)
         # Process eye blink detection
-        eye_blink_results = process_eye_blinks(filtered_data_dict, threshold_daq1, threshold_daq2, blink_data, fs_mmg, min_count=48)
+        BLINK_MIN_COUNT = 48  # Minimum number of values above threshold per sensor to detect a blink
+        eye_blink_results = process_eye_blinks(filtered_data_dict, threshold_daq1, threshold_daq2, blink_data, fs_mmg, min_count=BLINK_MIN_COUNT, windows=mmg_windows)
 
         print("Eye Blink Detection Results:")
         print(eye_blink_results)
@@ -121,13 +139,23 @@ def main():
         # Optionally, save the results to an Excel file
         eye_blink_results.to_excel('eye_blink_detection_results.xlsx', index=False)
 
+        # Optionally, continuous detection over the whole recording with the same thresholds, min_count
+        # and window length as the gesture windows, compared with the gesture windows afterwards
+        if get_blink_events():
+            window_s = (blink_data['Released'] - blink_data['Pressed']).median()
+            blink_events = detect_blink_events(filtered_data_dict, threshold_daq1, threshold_daq2, fs_mmg, window_s=window_s, min_count=BLINK_MIN_COUNT)
+            print("Continuous Eye Blink Events:")
+            print(match_blink_events(blink_events, blink_data, fs_mmg))
+
         # Plot MMG data with blink detection visualization for DAQ 1 and DAQ 2
-        plot_mmg_data(filtered_data_dict, blink_data, fs_mmg, eye_blink_results, 
+        render_queue.submit(plot_mmg_data, filtered_data_dict, blink_data, fs_mmg, eye_blink_results, 
                             output_file_daq1='mmg_data_daq1_with_blinks.png', 
                             output_file_daq2='mmg_data_daq2_with_blinks.png')
                 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
+    finally:
+        render_queue.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,100 @@
+from fractions import Fraction
+import numpy as np
+
+
+def time_to_index(times, fs):
+    """
+    Converts times in seconds to sample indices like the detectors do (int(time * fs)), for many times at once.
+
+    Args:
+        times (float or array-like): Times in seconds.
+        fs (float): Sampling frequency.
+
+    Returns:
+        np.ndarray: Sample indices (truncated towards zero).
+    """
+    return (np.asarray(times, dtype=float) * fs).astype(np.int64)
+
+
+def window_indices(gesture_data, fs):
+    """
+    Converts the 'Pressed' and 'Released' times of every gesture to sample indices at one rate.
+
+    Args:
+        gesture_data (pd.DataFrame): DataFrame with 'Pressed' and 'Released' times in seconds.
+        fs (float): Sampling frequency.
+
+    Returns:
+        np.ndarray: Array of shape (2, n_gestures) with the start and end index of every window,
+                    before any clipping to a signal.
+    """
+    return np.stack((time_to_index(gesture_data['Pressed'], fs), time_to_index(gesture_data['Released'], fs)))
+
+
+def window_slices(gesture_data, fs):
+    """
+    Computes the sample window of every gesture once for a sampling frequency.
+
+    Args:
+        gesture_data (pd.DataFrame): DataFrame with 'Pressed' and 'Released' times in seconds.
+        fs (float): Sampling frequency.
+
+    Returns:
+        list: One slice per gesture, in the order of gesture_data.
+    """
+    start_indices, end_indices = window_indices(gesture_data, fs)
+    return [slice(int(start), int(end)) for start, end in zip(start_indices, end_indices)]
+
+
+def window_bounds(gesture_data, fs, length, indices=None):
+    """
+    Computes the start and end sample of every gesture window at once, clipped to a signal of the
+    given length exactly like the slices of window_slices, so signal[start:end] is the same window.
+
+    Args:
+        gesture_data (pd.DataFrame): DataFrame with 'Pressed' and 'Released' times in seconds.
+        fs (float): Sampling frequency.
+        length (int): Number of samples of the signal.
+        indices (np.ndarray): Window indices at fs computed beforehand, see window_indices and
+                              map_index; the times of gesture_data are not converted again.
+
+    Returns:
+        starts (np.ndarray): First sample of each window.
+        ends (np.ndarray): End (exclusive) of each window, never before its start.
+    """
+    if indices is None:
+        indices = window_indices(gesture_data, fs)
+    bounds = []
+    for window_edges in indices:
+        window_edges = np.where(window_edges < 0, window_edges + length, window_edges)  # Negative indices count from the end, as in a slice
+        bounds.append(np.clip(window_edges, 0, length))
+    starts, ends = bounds
+    return starts, np.maximum(ends, starts)
+
+
+def rate_ratio(fs_from, fs_to):
+    """
+    Returns the reduced (up, down) factors that convert fs_from to fs_to, e.g. (1, 4) from 256 Hz to 64 Hz.
+    """
+    ratio = Fraction(fs_to).limit_denominator(1 << 16) / Fraction(fs_from).limit_denominator(1 << 16)
+    return ratio.numerator, ratio.denominator
+
+
+def map_index(indices, fs_from, fs_to):
+    """
+    Maps sample indices between two rates with exact integer arithmetic: index i at fs_from
+    becomes floor(i * fs_to / fs_from), so MMG sample j is IMU sample j // 4 and IMU sample i
+    is MMG sample 4 * i. For the windows of non-negative times, mapping the 256 Hz indices of
+    window_indices down to 64 Hz gives exactly the 64 Hz indices (floor(floor(4x) / 4) = floor(x)),
+    so the windows of both rates can be computed once from the MMG ones.
+
+    Args:
+        indices (int or array-like): Sample indices at fs_from.
+        fs_from (float): Sampling frequency of the indices.
+        fs_to (float): Sampling frequency to map to.
+
+    Returns:
+        np.ndarray: Sample indices at fs_to.
+    """
+    up, down = rate_ratio(fs_from, fs_to)
+    return np.asarray(indices, dtype=np.int64) * up // down
@@ -0,0 +1,414 @@
+import math
+import numpy as np
+from scipy.signal import lfilter
+
+from kalman_filter import OrientationKalmanFilter, initialize_ekf, kalman_steady_state, imu_measurements
+from imu_calibration import apply_calibration
+
+
+def tilt_heading(measurements):
+    """
+    Computes the orientation given by gravity and the magnetic field alone: roll and pitch from the
+    accelerometer and the tilt-compensated heading from the magnetometer.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (..., 9), see kalman_filter.imu_measurements.
+
+    Returns:
+        np.ndarray: Array of shape (..., 3) holding roll, pitch, and yaw in radians.
+    """
+    ax, ay, az = measurements[..., 0], measurements[..., 1], measurements[..., 2]
+    mx, my, mz = measurements[..., 6], measurements[..., 7], measurements[..., 8]
+
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.hypot(ay, az))
+
+    # Rotate the magnetic field back to the horizontal plane
+    sin_roll, cos_roll = np.sin(roll), np.cos(roll)
+    sin_pitch, cos_pitch = np.sin(pitch), np.cos(pitch)
+    mag_x = mx * cos_pitch + (my * sin_roll + mz * cos_roll) * sin_pitch
+    mag_y = my * cos_roll - mz * sin_roll
+    yaw = np.arctan2(-mag_y, mag_x)
+
+    return np.stack((roll, pitch, yaw), axis=-1)
+
+
+def wrap_angle(angle):
+    """
+    Wraps angles in radians to [-pi, pi).
+    """
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def body_to_euler_rates(gyro, roll, pitch):
+    """
+    Converts body angular rates to roll, pitch, and yaw rates (ZYX convention).
+
+    Args:
+        gyro (np.ndarray): Body rates of shape (..., 3) in rad/s.
+        roll (np.ndarray): Roll of shape (...) in radians.
+        pitch (np.ndarray): Pitch of shape (...) in radians.
+
+    Returns:
+        np.ndarray: Euler angle rates of shape (..., 3).
+    """
+    gx, gy, gz = gyro[..., 0], gyro[..., 1], gyro[..., 2]
+    sin_roll, cos_roll = np.sin(roll), np.cos(roll)
+    off_axis = gy * sin_roll + gz * cos_roll
+    cos_pitch = np.cos(pitch)
+    return np.stack((gx + off_axis * np.tan(pitch), gy * cos_roll - gz * sin_roll, off_axis / cos_pitch), axis=-1)
+
+
+def kalman_orientation(measurements, fs_imu):
+    """
+    Orientation of the 6-state linear Kalman filter, see kalman_filter.OrientationKalmanFilter.
+    """
+    return OrientationKalmanFilter(fs_imu).filter(measurements)[:, :3]
+
+
+def kalman_steady_state_orientation(measurements, fs_imu):
+    """
+    Orientation of the steady-state form of the Kalman filter, see kalman_filter.kalman_steady_state.
+    """
+    return kalman_steady_state(initialize_ekf(fs_imu), measurements)[:, :3]
+
+
+def complementary_orientation(measurements, fs_imu, alpha=0.98, gyro_scale=1.0):
+    """
+    Complementary filter: integrated gyroscope rates, high-passed, plus the accelerometer and
+    magnetometer angles (tilt_heading), low-passed. The body rates are converted to Euler angle
+    rates at the tilt_heading angles rather than the filtered ones, which keeps the recursion
+    angle[k] = alpha * (angle[k-1] + rate[k] * dt) + (1 - alpha) * tilt_heading[k]
+    a first-order IIR filter, so all samples (and all sessions of a batch) are filtered at once with lfilter.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (N, 9) or a batch of shape (S, N, 9).
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        alpha (float): Weight of the gyroscope, the time constant is alpha / (1 - alpha) samples.
+        gyro_scale (float): Gyroscope scale from volts to rad/s.
+
+    Returns:
+        np.ndarray: Array of shape (N, 3) or (S, N, 3) holding roll, pitch, and yaw in radians.
+    """
+    if measurements.shape[-2] == 0:
+        return np.empty(measurements.shape[:-1] + (3,))
+    dt = 1.0 / fs_imu
+    angles = tilt_heading(measurements)
+    angles[..., 2] = np.unwrap(angles[..., 2], axis=-1)  # Continuous heading so the low-pass does not average across +-pi
+
+    euler_rates = body_to_euler_rates(gyro_scale * measurements[..., 3:6], angles[..., 0], angles[..., 1])
+
+    drive = alpha * dt * euler_rates + (1 - alpha) * angles
+    rpy_data, _ = lfilter([1.0], [1.0, -alpha], drive, axis=-2, zi=alpha * angles[..., :1, :])  # Start at the first tilt/heading
+    rpy_data[..., 2] = wrap_angle(rpy_data[..., 2])
+    return rpy_data
+
+
+def _euler_to_quaternion(roll, pitch, yaw):
+    """
+    Converts roll, pitch, and yaw (ZYX convention) to a unit quaternion (w, x, y, z).
+    """
+    cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+    cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+    cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+    return (cr * cp * cy + sr * sp * sy,
+            sr * cp * cy - cr * sp * sy,
+            cr * sp * cy + sr * cp * sy,
+            cr * cp * sy - sr * sp * cy)
+
+
+def quaternion_to_euler(quaternions):
+    """
+    Converts unit quaternions (w, x, y, z) to roll, pitch, and yaw (ZYX convention).
+
+    Args:
+        quaternions (np.ndarray): Array of shape (..., 4).
+
+    Returns:
+        np.ndarray: Array of shape (..., 3) holding roll, pitch, and yaw in radians.
+    """
+    w, x, y, z = np.moveaxis(quaternions, -1, 0)
+    roll = np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+    pitch = np.arcsin(np.clip(2 * (w * y - z * x), -1.0, 1.0))
+    yaw = np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+    return np.stack((roll, pitch, yaw), axis=-1)
+
+
+def _unit_rows(vectors):
+    """
+    Normalizes each row, leaving all-zero rows (missing samples) at zero.
+    """
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+def _madgwick_gradient(q0, q1, q2, q3, ax, ay, az, mx, my, mz, sqrt):
+    """
+    Gradient of Madgwick's objective function for unit gravity and magnetic field measurements.
+    Works on floats (sqrt=math.sqrt) and on arrays of sessions (sqrt=np.sqrt) alike.
+    """
+    q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+    q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+    q2q2, q2q3, q3q3 = q2 * q2, q2 * q3, q3 * q3
+
+    # Reference direction of the Earth's magnetic field
+    hx = mx * (q0q0 + q1q1 - q2q2 - q3q3) + 2 * my * (q1q2 - q0q3) + 2 * mz * (q0q2 + q1q3)
+    hy = 2 * mx * (q0q3 + q1q2) + my * (q0q0 - q1q1 + q2q2 - q3q3) + 2 * mz * (q2q3 - q0q1)
+    bx = sqrt(hx * hx + hy * hy)
+    bz = 2 * mx * (q1q3 - q0q2) + 2 * my * (q0q1 + q2q3) + mz * (q0q0 - q1q1 - q2q2 + q3q3)
+
+    # Objective function: predicted minus measured gravity and magnetic field
+    f1 = 2 * (q1q3 - q0q2) - ax
+    f2 = 2 * (q0q1 + q2q3) - ay
+    f3 = 1 - 2 * (q1q1 + q2q2) - az
+    f4 = 2 * bx * (0.5 - q2q2 - q3q3) + 2 * bz * (q1q3 - q0q2) - mx
+    f5 = 2 * bx * (q1q2 - q0q3) + 2 * bz * (q0q1 + q2q3) - my
+    f6 = 2 * bx * (q0q2 + q1q3) + 2 * bz * (0.5 - q1q1 - q2q2) - mz
+
+    # Gradient (Jacobian transpose times the objective function)
+    s0 = -2 * q2 * f1 + 2 * q1 * f2 - 2 * bz * q2 * f4 + (-2 * bx * q3 + 2 * bz * q1) * f5 + 2 * bx * q2 * f6
+    s1 = 2 * q3 * f1 + 2 * q0 * f2 - 4 * q1 * f3 + 2 * bz * q3 * f4 + (2 * bx * q2 + 2 * bz * q0) * f5 + (2 * bx * q3 - 4 * bz * q1) * f6
+    s2 = -2 * q0 * f1 + 2 * q3 * f2 - 4 * q2 * f3 + (-4 * bx * q2 - 2 * bz * q0) * f4 + (2 * bx * q1 + 2 * bz * q3) * f5 + (2 * bx * q0 - 4 * bz * q2) * f6
+    s3 = 2 * q1 * f1 + 2 * q2 * f2 + (-4 * bx * q3 + 2 * bz * q1) * f4 + (-2 * bx * q0 + 2 * bz * q2) * f5 + 2 * bx * q1 * f6
+    return s0, s1, s2, s3
+
+
+def madgwick_orientation(measurements, fs_imu, beta=0.1, gyro_scale=1.0):
+    """
+    Madgwick's gradient-descent quaternion filter (MARG version with magnetic distortion
+    compensation). The normalization of the accelerometer and magnetometer, the scaling and the
+    conversion to Euler angles are vectorized; the quaternion update is a scalar loop of about
+    150 floating-point operations per sample.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (N, 9), see kalman_filter.imu_measurements.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        beta (float): Gradient-descent step, larger values trust the accelerometer and magnetometer more.
+        gyro_scale (float): Gyroscope scale from volts to rad/s.
+
+    Returns:
+        np.ndarray: Array of shape (N, 3) holding roll, pitch, and yaw in radians.
+    """
+    num_samples = len(measurements)
+    if num_samples == 0:
+        return np.empty((0, 3))
+    dt = 1.0 / fs_imu
+    measurements = np.asarray(measurements, dtype=np.float64)
+    gyro = (measurements[:, 3:6] * gyro_scale).tolist()
+    acc = _unit_rows(measurements[:, 0:3]).tolist()
+    mag = _unit_rows(measurements[:, 6:9]).tolist()
+    quaternions = np.empty((num_samples, 4))
+
+    # Start at the orientation given by gravity and the magnetic field
+    q0, q1, q2, q3 = _euler_to_quaternion(*tilt_heading(measurements[:1])[0])
+
+    for t in range(num_samples):
+        gx, gy, gz = gyro[t]
+        ax, ay, az = acc[t]
+        mx, my, mz = mag[t]
+
+        # Rate of change of the quaternion from the gyroscope
+        qdot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qdot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qdot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qdot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        if (ax or ay or az) and (mx or my or mz):
+            s0, s1, s2, s3 = _madgwick_gradient(q0, q1, q2, q3, ax, ay, az, mx, my, mz, math.sqrt)
+            norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm > 0:
+                qdot0 -= beta * s0 / norm
+                qdot1 -= beta * s1 / norm
+                qdot2 -= beta * s2 / norm
+                qdot3 -= beta * s3 / norm
+
+        q0 += qdot0 * dt
+        q1 += qdot1 * dt
+        q2 += qdot2 * dt
+        q3 += qdot3 * dt
+        norm = math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0, q1, q2, q3 = q0 / norm, q1 / norm, q2 / norm, q3 / norm
+        quaternions[t] = (q0, q1, q2, q3)
+
+    return quaternion_to_euler(quaternions)
+
+
+# Number of sessions from which the lockstep Madgwick loop beats one scalar loop per session
+MADGWICK_LOCKSTEP_MIN_SESSIONS = 25
+
+
+def kalman_orientation_batch(measurements, fs_imu):
+    """
+    Kalman orientation of a batch of sessions filtered in lockstep, see OrientationKalmanFilter.filter_batch.
+    """
+    return OrientationKalmanFilter(fs_imu).filter_batch(measurements)[..., :3]
+
+
+def kalman_steady_state_orientation_batch(measurements, fs_imu):
+    """
+    Steady-state Kalman orientation of a batch of sessions. Each session is already filtered
+    without a per-sample loop, so the sessions are simply processed one after the other.
+    """
+    ekf = initialize_ekf(fs_imu)
+    return np.stack([kalman_steady_state(ekf, session_measurements)[:, :3] for session_measurements in measurements])
+
+
+def madgwick_orientation_batch(measurements, fs_imu, beta=0.1, gyro_scale=1.0):
+    """
+    Madgwick filter of a batch of sessions advanced in lockstep: every quaternion component is an
+    array over the sessions, so each time step costs the same number of numpy operations whatever
+    the number of sessions. Below MADGWICK_LOCKSTEP_MIN_SESSIONS sessions the scalar loop of
+    madgwick_orientation is faster and is used per session instead.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (S, N, 9), shorter sessions padded at the end.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        beta (float): Gradient-descent step, larger values trust the accelerometer and magnetometer more.
+        gyro_scale (float): Gyroscope scale from volts to rad/s.
+
+    Returns:
+        np.ndarray: Array of shape (S, N, 3) holding roll, pitch, and yaw in radians.
+    """
+    num_sessions, num_samples = measurements.shape[:2]
+    if num_samples == 0:
+        return np.empty((num_sessions, 0, 3))
+    if num_sessions < MADGWICK_LOCKSTEP_MIN_SESSIONS:
+        return np.stack([madgwick_orientation(session_measurements, fs_imu, beta, gyro_scale) for session_measurements in measurements])
+    dt = 1.0 / fs_imu
+    measurements = np.asarray(measurements, dtype=np.float64)
+    acc = _unit_rows(measurements[..., 0:3])
+    mag = _unit_rows(measurements[..., 6:9])
+    # Both references are needed for a correction step, missing samples only use the gyroscope
+    weight = beta * (np.any(acc != 0, axis=-1) & np.any(mag != 0, axis=-1))
+
+    # (10, N, S): one contiguous row over the sessions per quantity and time step
+    columns = np.concatenate((measurements[..., 3:6] * gyro_scale, acc, mag, weight[..., None]), axis=-1)
+    columns = np.ascontiguousarray(columns.transpose(2, 1, 0))
+    quaternions = np.empty((num_samples, 4, num_sessions))
+
+    # Start at the orientation given by gravity and the magnetic field
+    q0, q1, q2, q3 = np.array([_euler_to_quaternion(*angles) for angles in tilt_heading(measurements[:, 0])]).T
+
+    for t in range(num_samples):
+        gx, gy, gz, ax, ay, az, mx, my, mz, w = columns[:, t]
+
+        # Rate of change of the quaternion from the gyroscope
+        qdot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        qdot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        qdot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        qdot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        s0, s1, s2, s3 = _madgwick_gradient(q0, q1, q2, q3, ax, ay, az, mx, my, mz, np.sqrt)
+        norm = np.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+        step = np.divide(w, norm, out=np.zeros(num_sessions), where=norm > 0)
+        q0 = q0 + (qdot0 - step * s0) * dt
+        q1 = q1 + (qdot1 - step * s1) * dt
+        q2 = q2 + (qdot2 - step * s2) * dt
+        q3 = q3 + (qdot3 - step * s3) * dt
+        norm = np.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+        q0, q1, q2, q3 = q0 / norm, q1 / norm, q2 / norm, q3 / norm
+        quaternions[t] = (q0, q1, q2, q3)
+
+    return quaternion_to_euler(quaternions.transpose(2, 0, 1))
+
+
+# Orientation engines by name: function(measurements, fs_imu) -> (N, 3) roll, pitch, yaw
+ORIENTATION_ENGINES = {
+    "kalman": kalman_orientation,
+    "kalman_steady_state": kalman_steady_state_orientation,
+    "complementary": complementary_orientation,
+    "madgwick": madgwick_orientation,
+}
+
+
+def estimate_orientation(sensor_data, fs_imu, engine="kalman", calibration=None, **engine_args):
+    """
+    Estimates roll, pitch, and yaw from 9-axis IMU data with one of ORIENTATION_ENGINES.
+
+    The Kalman engines treat the accelerometer and magnetometer volts as angles and the
+    gyroscope volts as rates, which is what the head-movement thresholds were tuned on.
+    The complementary and Madgwick engines return physical angles in radians.
+
+    Args:
+        sensor_data (dict): Dictionary containing IMU sensor data in time series format for Aclm, Gyro, and Mag.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        engine (str): Name of the engine, see ORIENTATION_ENGINES.
+        calibration (dict): Optional IMU calibration of the headband, see imu_calibration.
+        **engine_args: Extra arguments of the engine, e.g. alpha or beta.
+
+    Returns:
+        np.ndarray: Array of shape (N, 3) holding roll, pitch, and yaw (float32 for float32 input).
+    """
+    if engine not in ORIENTATION_ENGINES:
+        raise ValueError(f"Unknown orientation engine {engine!r}, expected one of {sorted(ORIENTATION_ENGINES)}")
+    measurements = imu_measurements(sensor_data)
+    if calibration is not None:
+        measurements = apply_calibration(measurements, calibration)
+    rpy_data = ORIENTATION_ENGINES[engine](measurements, fs_imu, **engine_args)
+    return rpy_data.astype(np.result_type(measurements, np.float32))
+
+
+# Batch versions of ORIENTATION_ENGINES: function(measurements, fs_imu) -> (S, N, 3)
+ORIENTATION_BATCH_ENGINES = {
+    "kalman": kalman_orientation_batch,
+    "kalman_steady_state": kalman_steady_state_orientation_batch,
+    "complementary": complementary_orientation,
+    "madgwick": madgwick_orientation_batch,
+}
+
+
+def pad_sessions(measurement_list):
+    """
+    Stacks the measurements of several sessions into one zero-padded batch.
+
+    Args:
+        measurement_list (list): Measurement arrays of shape (N_i, 9), see kalman_filter.imu_measurements.
+
+    Returns:
+        measurements (np.ndarray): Array of shape (S, max N_i, 9).
+        lengths (np.ndarray): Number of samples N_i of each session.
+    """
+    lengths = np.array([len(session_measurements) for session_measurements in measurement_list], dtype=np.int64)
+    dtype = np.result_type(*measurement_list) if measurement_list else np.float64
+    measurements = np.zeros((len(measurement_list), lengths.max(initial=0), 9), dtype=dtype)
+    for i, session_measurements in enumerate(measurement_list):
+        measurements[i, :lengths[i]] = session_measurements
+    return measurements, lengths
+
+
+def orientation_batch(measurements, lengths, fs_imu, engine="kalman", **engine_args):
+    """
+    Estimates roll, pitch, and yaw for a batch of sessions with one of ORIENTATION_BATCH_ENGINES.
+    The filters are causal, so the padding does not affect the samples of shorter sessions.
+
+    Args:
+        measurements (np.ndarray): Measurements of shape (S, N, 9), see pad_sessions.
+        lengths (np.ndarray): Number of valid samples of each session.
+        fs_imu (int): Sampling frequency of the IMU sensors.
+        engine (str): Name of the engine, see ORIENTATION_BATCH_ENGINES.
+        **engine_args: Extra arguments of the engine, e.g. alpha or beta.
+
+    Returns:
+        np.ndarray: Array of shape (S, N, 3) holding roll, pitch, and yaw, NaN past the end of each session.
+    """
+    if engine not in ORIENTATION_BATCH_ENGINES:
+        raise ValueError(f"Unknown orientation engine {engine!r}, expected one of {sorted(ORIENTATION_BATCH_ENGINES)}")
+    rpy_data = ORIENTATION_BATCH_ENGINES[engine](measurements, fs_imu, **engine_args)
+    rpy_data = rpy_data.astype(np.result_type(measurements, np.float32))
+    rpy_data[np.arange(measurements.shape[1]) >= np.asarray(lengths)[:, None]] = np.nan
+    return rpy_data
+
+
+def estimate_orientation_batch(sensor_data_list, fs_imu, engine="kalman", calibration=None, **engine_args):
+    """
+    Batch version of estimate_orientation for the DAQ 1 sensor data of several sessions
+    recorded with the same headband.
+
+    Returns:
+        list: One array of shape (N_i, 3) holding roll, pitch, and yaw per session.
+    """
+    measurements, lengths = pad_sessions([imu_measurements(sensor_data) for sensor_data in sensor_data_list])
+    if calibration is not None:
+        measurements = apply_calibration(measurements, calibration)
+    rpy_data = orientation_batch(measurements, lengths, fs_imu, engine, **engine_args)
+    return [session_rpy[:length] for session_rpy, length in zip(rpy_data, lengths)]
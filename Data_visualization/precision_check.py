@@ -0,0 +1,93 @@
+import argparse
+import logging
+import numpy as np
+import pandas as pd
+
+from config import get_data_dir, get_fs_MMG_sensor, get_fs_IMU_sensor
+from daq_processing import process_multiple_daqs
+from band_pass_filter import band_pass_mmg_batch
+from kalman_filter import imu_to_roll_pitch_yaw_ekf
+from head_movement import load_gesture_data_from_excel, process_gestures
+from eye_blink_v2 import process_eye_blinks, calculate_threshold
+from batch_processing import PIPELINE_PARAMS, discover_sessions
+
+
+def run_signal_path(session, dtype, params=PIPELINE_PARAMS):
+    """
+    Runs the pipeline of batch_processing.process_session for one session in the given float type,
+    without the session cache.
+
+    Returns:
+        stages (dict): Output arrays of every stage, keyed by "<stage>/<signal>".
+        head_results (pd.DataFrame): Output of process_gestures.
+        blink_results (pd.DataFrame): Output of process_eye_blinks.
+    """
+    fs_mmg = get_fs_MMG_sensor()
+    fs_imu = get_fs_IMU_sensor()
+    sensor_data_list = process_multiple_daqs(session["daq_files"], fs_mmg, dtype)
+
+    stages = {}
+    for i, sensor_data in enumerate(sensor_data_list):
+        for sensor_name in sensor_data:
+            stages[f"sensor_data/DAQ_{i+1}_{sensor_name}"] = np.asarray(sensor_data[sensor_name])
+
+    filtered_data_dict = {}
+    for i, filtered_mmg_data in enumerate(band_pass_mmg_batch(sensor_data_list, params["low_cutoff"], params["high_cutoff"], fs_mmg)):
+        for j in range(6):
+            filtered_data_dict[f"DAQ_{i+1}_A{j}"] = filtered_mmg_data[j]
+
+    IMU_RPY_data = imu_to_roll_pitch_yaw_ekf(sensor_data_list[0], fs_imu, "DAQ_1", render=False)
+    filtered_data_dict["DAQ_1_r"] = IMU_RPY_data[:, 0]
+    filtered_data_dict["DAQ_1_p"] = IMU_RPY_data[:, 1]
+    filtered_data_dict["DAQ_1_y"] = IMU_RPY_data[:, 2]
+    for key, data in filtered_data_dict.items():
+        stages[f"{'ekf' if key.endswith(('_r', '_p', '_y')) else 'band_pass'}/{key}"] = data
+
+    gesture_data = load_gesture_data_from_excel(session["excel_file"])
+    head_results = process_gestures(filtered_data_dict, gesture_data, params["pitch_threshold"], params["yaw_threshold_right"],
+                                    params["yaw_threshold_left"], fs_imu, params["head_min_count"])
+    thresholds = calculate_threshold(filtered_data_dict, gesture_data, fs_mmg, quantile=params["blink_quantile"])
+    for daq, daq_thresholds in enumerate(thresholds, start=1):
+        stages[f"threshold/DAQ_{daq}"] = np.asarray(daq_thresholds, dtype=float)
+    blink_results = process_eye_blinks(filtered_data_dict, *thresholds, gesture_data, fs_mmg, min_count=params["blink_min_count"])
+    return stages, head_results, blink_results
+
+
+def compare_signal_paths(session, params=PIPELINE_PARAMS, dtype="float32"):
+    """
+    Compares a reduced-precision signal path with the float64 path on one session.
+
+    Args:
+        session (dict): Session description from batch_processing.discover_sessions.
+        params (dict): Pipeline parameters, see batch_processing.PIPELINE_PARAMS.
+        dtype (str): Float type to check against float64.
+
+    Returns:
+        dict: Per stage the largest absolute error relative to the peak float64 value,
+              the number of gestures, and how many head and blink detections differ.
+    """
+    reference, reference_head, reference_blink = run_signal_path(session, "float64", params)
+    reduced, reduced_head, reduced_blink = run_signal_path(session, dtype, params)
+
+    report = {"session": session["session"], "gestures": len(reference_head)}
+    for name, data in reference.items():
+        stage = name.split("/", 1)[0]
+        peak = np.max(np.abs(data)) if data.size else 0.0
+        error = np.max(np.abs(reduced[name].astype(np.float64) - data)) / peak if peak > 0 else 0.0
+        report[f"{stage}_rel_error"] = max(report.get(f"{stage}_rel_error", 0.0), float(error))
+
+    report["head_mismatches"] = int((reference_head["Detected_Movement"].fillna(-1) != reduced_head["Detected_Movement"].fillna(-1)).sum())
+    report["blink_mismatches"] = int((reference_blink["Detected_Blink"].fillna(-1) != reduced_blink["Detected_Blink"].fillna(-1)).sum())
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the accuracy of the float32 signal path against float64.")
+    parser.add_argument("--data-dir", default=get_data_dir(), help="Directory containing the recordings")
+    parser.add_argument("--dtype", default="float32", help="Float type to check")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    reports = pd.DataFrame([compare_signal_paths(session, dtype=args.dtype) for session in discover_sessions(args.data_dir)])
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(reports)
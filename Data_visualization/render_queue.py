@@ -0,0 +1,77 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+RENDER_MODES = ("inline", "background", "off")
+
+
+def _init_render_worker():
+    """
+    Selects the non-interactive backend in background render processes.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+class RenderQueue:
+    """
+    Runs figure functions separately from the DSP stages.
+
+    In "inline" mode a figure is rendered as soon as it is submitted, in "background" mode it is
+    queued to a process pool while the pipeline continues, and in "off" mode it is skipped.
+    Submitted arguments are pickled in background mode, so pass arrays and DataFrames rather
+    than lazily loaded sensor data.
+
+    Args:
+        mode (str): "inline", "background" or "off".
+        max_workers (int): Number of render processes in background mode.
+    """
+
+    def __init__(self, mode="inline", max_workers=1):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {mode!r}, expected one of {list(RENDER_MODES)}")
+        self.mode = mode
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_render_worker) if mode == "background" else None
+        self._futures = []
+
+    def submit(self, plot_func, *args, **kwargs):
+        """
+        Renders a figure according to the mode by calling plot_func(*args, **kwargs).
+        """
+        if self.mode == "off":
+            return
+        if self.mode == "inline":
+            plot_func(*args, **kwargs)
+            return
+        self._futures.append((plot_func.__name__, self._executor.submit(plot_func, *args, **kwargs)))
+
+    def wait(self):
+        """
+        Waits for all queued figures, logging any that failed.
+
+        Returns:
+            int: Number of figures that failed to render.
+        """
+        failed = 0
+        for name, future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                logging.error(f"Error rendering {name}: {e}")
+        self._futures = []
+        return failed
+
+    def close(self):
+        """
+        Waits for all queued figures and shuts the render processes down.
+        """
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from daq_processing import process_multiple_daqs
+from daq_alignment import process_multiple_daqs_aligned
+from band_pass_filter import band_pass_mmg_batch
+from kalman_filter import imu_to_roll_pitch_yaw_ekf
+from orientation import estimate_orientation
+
+# Bump when the layout or meaning of cached arrays changes so stale entries are never reused
+CACHE_VERSION = 2
+
+_file_hash_memo = {}
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """
+    Computes the SHA-256 of a file's content, memoized per (path, size, mtime).
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Number of bytes read per step.
+
+    Returns:
+        str: Hex digest of the file content.
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hash_memo:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        _file_hash_memo[memo_key] = digest.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+class SessionCache:
+    """
+    On-disk cache of per-stage session arrays with size-bounded LRU eviction.
+
+    Each entry is a directory named "<stage>_<key>" holding one .npy file per array.
+    The directory's modification time records the last access and drives eviction.
+
+    Args:
+        cache_dir (str): Directory holding the cache entries.
+        max_bytes (int): Upper bound on the total size of all entries.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, stage, source_files, params):
+        """
+        Builds the cache key for a stage from the content hash of its source files and its parameters.
+
+        Args:
+            stage (str): Stage name, e.g. "sensor_data" or "band_pass_mmg_batch".
+            source_files (list): Paths of the .dat files the stage depends on.
+            params (dict): JSON-serializable stage parameters.
+
+        Returns:
+            str: Hex digest identifying the entry.
+        """
+        description = {
+            "version": CACHE_VERSION,
+            "stage": stage,
+            "sources": [file_hash(path) for path in source_files],
+            "params": params,
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    def _entry_dir(self, stage, key):
+        return os.path.join(self.cache_dir, f"{stage}_{key}")
+
+    def load(self, stage, key):
+        """
+        Loads a cached entry, memory-mapping its arrays.
+
+        Returns:
+            dict or None: Array name to array, or None on a cache miss.
+        """
+        entry_dir = self._entry_dir(stage, key)
+        if not os.path.isdir(entry_dir):
+            return None
+
+        try:
+            with open(os.path.join(entry_dir, "names.json")) as f:
+                names = json.load(f)
+            arrays = {name: np.load(os.path.join(entry_dir, f"{i}.npy"), mmap_mode="r") for i, name in enumerate(names)}
+            os.utime(entry_dir)  # Mark as most recently used
+        except OSError:
+            # Entry was evicted by another process while loading
+            return None
+        logging.info(f"Session cache hit for {stage}")
+        return arrays
+
+    def store(self, stage, key, arrays):
+        """
+        Stores an entry atomically and evicts least recently used entries if the cache is over its size bound.
+
+        Args:
+            stage (str): Stage name.
+            key (str): Key from make_key.
+            arrays (dict): Array name to array.
+        """
+        entry_dir = self._entry_dir(stage, key)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp_")
+        try:
+            names = list(arrays)
+            for i, name in enumerate(names):
+                np.save(os.path.join(tmp_dir, f"{i}.npy"), np.asarray(arrays[name]))
+            with open(os.path.join(tmp_dir, "names.json"), "w") as f:
+                json.dump(names, f)
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # Another process may have stored the same entry first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.isdir(entry_dir):
+                raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the total size is within max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path))
+            entries.append((os.path.getmtime(path), size, path))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+            logging.info(f"Evicted session cache entry {os.path.basename(path)}")
+
+    def cached_stage(self, stage, source_files, params, compute):
+        """
+        Returns the cached arrays for a stage, computing and storing them on a miss.
+
+        Args:
+            stage (str): Stage name.
+            source_files (list): Paths of the .dat files the stage depends on.
+            params (dict): JSON-serializable stage parameters.
+            compute (callable): Zero-argument function returning a dict of arrays.
+
+        Returns:
+            dict: Array name to array.
+        """
+        key = self.make_key(stage, source_files, params)
+        arrays = self.load(stage, key)
+        if arrays is None:
+            arrays = compute()
+            self.store(stage, key, arrays)
+        return arrays
+
+
+def cached_process_multiple_daqs(cache, daq_files, fs_sensor, alignment="trailing_zeros", dtype="float64"):
+    """
+    Cached version of process_multiple_daqs. Stores the voltage-converted channels of every DAQ.
+    alignment selects how DAQ2 is aligned to DAQ1, see config.get_daq_alignment, and dtype
+    the float type of the channels, see config.get_signal_dtype.
+
+    Returns:
+        list: One dict of sensor data per DAQ file.
+    """
+    def compute():
+        if alignment == "trailing_zeros":
+            sensor_data_list = process_multiple_daqs(daq_files, fs_sensor, dtype)
+        elif alignment in ("xcorr", "xcorr_drift"):
+            sensor_data_list = process_multiple_daqs_aligned(daq_files, fs_sensor, estimate_drift=(alignment == "xcorr_drift"), dtype=dtype)
+        else:
+            raise ValueError(f"Unknown DAQ alignment {alignment!r}")
+        return {
+            f"{i}/{sensor_name}": np.asarray(sensor_data[sensor_name])
+            for i, sensor_data in enumerate(sensor_data_list)
+            for sensor_name in sensor_data
+        }
+
+    arrays = cache.cached_stage("sensor_data", daq_files, {"fs_sensor": fs_sensor, "alignment": alignment, "dtype": str(np.dtype(dtype))}, compute)
+
+    sensor_data_list = [{} for _ in daq_files]
+    for name, data in arrays.items():
+        i, sensor_name = name.split("/", 1)
+        sensor_data_list[int(i)][sensor_name] = data
+    return sensor_data_list
+
+
+def cached_band_pass_mmg_batch(cache, daq_files, sensor_data_list, low_cutoff, high_cutoff, fs_mmg, filter_order=10, alignment="trailing_zeros", dtype="float64"):
+    """
+    Cached version of band_pass_mmg_batch.
+
+    Returns:
+        list: One filtered MMG array of shape (6, N) per DAQ.
+    """
+    def compute():
+        filtered_mmg_list = band_pass_mmg_batch(sensor_data_list, low_cutoff, high_cutoff, fs_mmg, filter_order)
+        return {f"mmg/{i}": data for i, data in enumerate(filtered_mmg_list)}
+
+    params = {
+        "low_cutoff": low_cutoff,
+        "high_cutoff": high_cutoff,
+        "fs_mmg": fs_mmg,
+        "filter_order": filter_order,
+        "alignment": alignment,
+        "dtype": str(np.dtype(dtype)),
+    }
+    arrays = cache.cached_stage("band_pass_mmg_batch", daq_files, params, compute)
+    return [arrays[f"mmg/{i}"] for i in range(len(sensor_data_list))]
+
+
+def cached_imu_to_roll_pitch_yaw_ekf(cache, daq_files, sensor_data, fs_imu, database_name, dtype="float64", steady_state=False):
+    """
+    Cached version of imu_to_roll_pitch_yaw_ekf, without figures (see kalman_filter.plot_roll_pitch_yaw).
+
+    Returns:
+        np.ndarray: Numpy array with shape (N, 3) holding roll, pitch, and yaw.
+    """
+    def compute():
+        return {"rpy": imu_to_roll_pitch_yaw_ekf(sensor_data, fs_imu, database_name, render=False, steady_state=steady_state)}
+
+    params = {"fs_imu": fs_imu, "database_name": database_name, "dtype": str(np.dtype(dtype)), "steady_state": steady_state}
+    return cache.cached_stage("ekf", daq_files, params, compute)["rpy"]
+
+
+def cached_orientation(cache, daq_files, sensor_data, fs_imu, engine="kalman", dtype="float64", calibration=None):
+    """
+    Cached version of orientation.estimate_orientation. The calibration is part of the key,
+    so results are recomputed when a headband is recalibrated.
+
+    Returns:
+        np.ndarray: Numpy array with shape (N, 3) holding roll, pitch, and yaw.
+    """
+    def compute():
+        return {"rpy": estimate_orientation(sensor_data, fs_imu, engine, calibration)}
+
+    params = {"fs_imu": fs_imu, "engine": engine, "dtype": str(np.dtype(dtype))}
+    if calibration is not None:
+        params["calibration"] = {"offset": np.asarray(calibration["offset"]).tolist(), "matrix": np.asarray(calibration["matrix"]).tolist()}
+    return cache.cached_stage("orientation", daq_files, params, compute)["rpy"]
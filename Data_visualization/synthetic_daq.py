@@ -0,0 +1,216 @@
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+from daq_processing import DAQ_CHANNELS, MMG_CHANNELS, IMU_CHANNELS
+
+# Per-channel baseline and noise (in ADC counts) resembling the recorded sessions
+MMG_BASELINE = np.array([20, 10, 10, 10, 40, 3000, 5, 1000])
+MMG_NOISE = np.array([60, 30, 15, 40, 170, 150, 10, 50])
+IMU_BASELINE = np.array([-40, 40, 20, 90, -4000, 800, -1000, 1000, -150])
+IMU_NOISE = np.array([300, 300, 300, 300, 300, 300, 150, 150, 150])
+
+# Gesture name, head movement (0: front, 1: left, 2: right), eye blink (0: both, 1: left, 2: right, 3: none),
+# as written by the stimuli app. The first two rows are the threshold windows used by calculate_threshold.
+THRESHOLD_GESTURES = [
+    ("Left_EyeBlink_threshold_time_window", 0, 1),
+    ("Right_EyeBlink_threshold_time_window", 0, 2),
+]
+GESTURES = [
+    ("Both_Eyeblink", 0, 0),
+    ("Left_EyeBlink", 0, 1),
+    ("Left_Head_Movement", 1, 3),
+    ("Right_EyeBlink", 0, 2),
+    ("Right_Head_Movement", 2, 3),
+]
+
+
+def make_gesture_schedule(duration_s, event_interval_s=5.0, event_duration_s=2.0, start_s=2.0, gestures=GESTURES):
+    """
+    Builds the ground-truth table for a synthetic session: the two threshold windows
+    followed by the gestures repeated until the end of the recording.
+
+    Args:
+        duration_s (float): Length of the recording in seconds.
+        event_interval_s (float): Time between the starts of consecutive gestures.
+        event_duration_s (float): Length of each gesture window.
+        start_s (float): Start time of the first gesture.
+        gestures (list): (name, head movement, eye blink) tuples cycled through after the threshold windows.
+
+    Returns:
+        pd.DataFrame: Gesture, Pressed, Released, Head_movement and Eye_blink columns, times in seconds.
+    """
+    rows = []
+    pressed = start_s
+    while pressed + event_duration_s <= duration_s:
+        i = len(rows)
+        if i < len(THRESHOLD_GESTURES):
+            gesture, head_movement, eye_blink = THRESHOLD_GESTURES[i]
+        else:
+            gesture, head_movement, eye_blink = gestures[(i - len(THRESHOLD_GESTURES)) % len(gestures)]
+        rows.append({
+            "Gesture": gesture,
+            "Pressed": round(pressed, 3),
+            "Released": round(pressed + event_duration_s, 3),
+            "Head_movement": head_movement,
+            "Eye_blink": eye_blink,
+        })
+        pressed += event_interval_s
+    return pd.DataFrame(rows, columns=["Gesture", "Pressed", "Released", "Head_movement", "Eye_blink"])
+
+
+def _add_events(block, block_start, schedule, daq_index, fs, offset_frames, blink_amplitude, blink_duration_s, head_amplitude, with_imu):
+    """
+    Adds the blink and head-movement waveforms of every gesture overlapping a block of frames.
+    Gesture times are on the MMG timeline, where sample k is frame k + 2.
+    """
+    block_stop = block_start + len(block)
+    centers = ((schedule["Pressed"] + schedule["Released"]) / 2 * fs).astype(int) + 2 + offset_frames
+    margin = int(max(blink_duration_s / 2, 0.5) * fs)
+    overlapping = (centers + margin > block_start) & (centers - margin < block_stop)
+
+    for center, row in zip(centers[overlapping], schedule[overlapping].itertuples(index=False)):
+
+        # Eye blink: a 12 Hz burst on the MMG channels of the blinking side(s)
+        blink_sides = {0: (0, 1), 1: (0,), 2: (1,)}.get(row.Eye_blink, ())
+        if daq_index in blink_sides:
+            half = int(blink_duration_s / 2 * fs)
+            lo, hi = max(center - half, block_start), min(center + half, block_stop)
+            if lo < hi:
+                t = np.arange(lo, hi) - (center - half)
+                burst = np.hanning(2 * half)[t] * np.sin(2 * np.pi * 12.0 * t / fs)
+                block[lo - block_start:hi - block_start, :len(MMG_CHANNELS)] += (blink_amplitude * burst)[:, None].astype(np.int32)
+
+        if row.Head_movement not in (1, 2):
+            continue
+
+        # Head movement: one 1 s cycle, seen by the accelerometers (A5 to A7) of both DAQs
+        half = int(0.5 * fs)
+        lo, hi = max(center - half, block_start), min(center + half, block_stop)
+        if lo >= hi:
+            continue
+        t = np.arange(lo, hi) - (center - half)
+        cycle = np.sin(2 * np.pi * t / (2 * half))
+        sign = 1 if row.Head_movement == 1 else -1  # Left: yaw up then down, right: yaw down then up
+        block[lo - block_start:hi - block_start, 5:8] += (0.1 * head_amplitude * cycle)[:, None].astype(np.int32)
+
+        if with_imu:
+            # Roll (Aclm_X, Mag_X) bumps towards the turning side, yaw (Aclm_Z, Mag_Z) swings
+            imu_rows = block[lo - block_start:hi - block_start]
+            is_imu = np.any(imu_rows[:, 8:] != 0, axis=1)
+            roll = (sign * head_amplitude * np.hanning(2 * half)[t]).astype(np.int32)
+            yaw = (sign * head_amplitude * cycle).astype(np.int32)
+            imu_rows[is_imu, 8] += roll[is_imu]
+            imu_rows[is_imu, 14] += roll[is_imu]
+            imu_rows[is_imu, 10] += yaw[is_imu]
+            imu_rows[is_imu, 16] += yaw[is_imu]
+
+
+def write_synthetic_daq(sd_file, n_frames, schedule, daq_index, fs=256, with_imu=False, first_imu_frame=5,
+                        offset_frames=0, noise_level=1.0, blink_amplitude=400, blink_duration_s=1.6,
+                        head_amplitude=4000, block_size=65536, seed=None):
+    """
+    Writes a firmware-compatible DAQ file (17 int32 columns per frame) in blocks, so any length fits in memory.
+
+    Args:
+        sd_file (str): Path of the .dat file to write.
+        n_frames (int): Number of 256 Hz frames.
+        schedule (pd.DataFrame): Ground-truth table from make_gesture_schedule.
+        daq_index (int): 0 for DAQ1 (left side), 1 for DAQ2 (right side).
+        fs (int): Sampling frequency of the MMG sensors.
+        with_imu (bool): Whether to write IMU samples on every 4th frame (DAQ1).
+        first_imu_frame (int): Frame of the first IMU sample.
+        offset_frames (int): Delay of this DAQ's clock relative to the ground truth, in frames.
+        noise_level (float): Multiplier of the per-channel noise.
+        blink_amplitude (int): Peak amplitude of a blink burst in counts.
+        blink_duration_s (float): Length of a blink burst in seconds.
+        head_amplitude (int): Peak amplitude of a head movement on the IMU in counts.
+        block_size (int): Number of frames generated per block.
+        seed (int): Seed of the noise generator.
+    """
+    rng = np.random.default_rng(seed)
+    with open(sd_file, "wb") as f:
+        for block_start in range(0, n_frames, block_size):
+            count = min(block_size, n_frames - block_start)
+            block = np.zeros((count, len(DAQ_CHANNELS)), dtype=np.int32)
+
+            mmg_noise = rng.normal(0.0, 1.0, (count, len(MMG_CHANNELS))) * MMG_NOISE * noise_level
+            block[:, :len(MMG_CHANNELS)] = np.rint(MMG_BASELINE + mmg_noise).astype(np.int32)
+
+            if with_imu:
+                frames = np.arange(block_start, block_start + count)
+                is_imu = (frames >= first_imu_frame) & ((frames - first_imu_frame) % 4 == 0)
+                imu_noise = rng.normal(0.0, 1.0, (int(is_imu.sum()), len(IMU_CHANNELS))) * IMU_NOISE * noise_level
+                block[is_imu, len(MMG_CHANNELS):] = np.rint(IMU_BASELINE + imu_noise).astype(np.int32)
+
+            if block_start == 0:
+                block[0] = 0  # The firmware's first frame is empty
+
+            _add_events(block, block_start, schedule, daq_index, fs, offset_frames, blink_amplitude, blink_duration_s, head_amplitude, with_imu)
+            np.clip(block[:, :len(MMG_CHANNELS)], 0, 2**13 - 1, out=block[:, :len(MMG_CHANNELS)])
+            np.clip(block[:, len(MMG_CHANNELS):], -2**15, 2**15 - 1, out=block[:, len(MMG_CHANNELS):])
+            block.astype("<i4").tofile(f)
+
+
+def generate_session(output_dir, session, duration_s, fs=256, frames_after_last_imu=3, first_imu_frame=5,
+                     daq2_offset_frames=0, daq2_extra_frames=0, noise_level=1.0, blink_amplitude=400,
+                     blink_duration_s=1.6, head_amplitude=4000, event_interval_s=5.0, event_duration_s=2.0, write_excel=True, seed=0):
+    """
+    Generates a synthetic session laid out like Data_files: DAQ1_IMU_DataNN.dat, DAQ2_DataNN.dat
+    and the ground truth as modified_Sequential_Play_N.xlsx and .csv.
+
+    Args:
+        output_dir (str): Directory to write the files to.
+        session (int): Session number used in the file names.
+        duration_s (float): Length of the recording in seconds (seconds to many hours).
+        fs (int): Sampling frequency of the MMG sensors.
+        frames_after_last_imu (int): Number of empty frames (0 to 3) after DAQ1's last IMU sample.
+                                     count_trailing_zeros reports 3 for 3 and 2 otherwise,
+                                     because the frames around an IMU sample are always empty.
+        first_imu_frame (int): Frame of DAQ1's first IMU sample.
+        daq2_offset_frames (int): Delay of DAQ2's clock relative to DAQ1, in frames.
+        daq2_extra_frames (int): Number of frames DAQ2 records beyond DAQ1.
+        noise_level (float): Multiplier of the per-channel noise.
+        blink_amplitude (int): Peak amplitude of a blink burst in counts.
+        blink_duration_s (float): Length of a blink burst in seconds.
+        head_amplitude (int): Peak amplitude of a head movement on the IMU in counts.
+        event_interval_s (float): Time between the starts of consecutive gestures.
+        event_duration_s (float): Length of each gesture window.
+        write_excel (bool): Whether to write the .xlsx ground truth in addition to the .csv.
+        seed (int): Seed of the noise generators.
+
+    Returns:
+        dict: Session description like batch_processing.discover_sessions, plus the ground-truth table.
+    """
+    if not 0 <= frames_after_last_imu <= 3:
+        raise ValueError("frames_after_last_imu must be between 0 and 3")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Choose the DAQ1 length so its last IMU sample is followed by exactly frames_after_last_imu frames
+    n_frames = int(duration_s * fs) + 2
+    while (n_frames - 1 - frames_after_last_imu - first_imu_frame) % 4 != 0:
+        n_frames += 1
+
+    schedule = make_gesture_schedule(duration_s, event_interval_s, event_duration_s)
+    daq_files = [
+        os.path.join(output_dir, f"DAQ1_IMU_Data{session:02d}.dat"),
+        os.path.join(output_dir, f"DAQ2_Data{session:02d}.dat"),
+    ]
+    common = dict(fs=fs, noise_level=noise_level, blink_amplitude=blink_amplitude, blink_duration_s=blink_duration_s,
+                  head_amplitude=head_amplitude)
+    write_synthetic_daq(daq_files[0], n_frames, schedule, 0, with_imu=True, first_imu_frame=first_imu_frame, seed=seed, **common)
+    write_synthetic_daq(daq_files[1], n_frames + daq2_extra_frames, schedule, 1, offset_frames=daq2_offset_frames, seed=seed + 1, **common)
+
+    excel_file = os.path.join(output_dir, f"modified_Sequential_Play_{session}.xlsx")
+    schedule.to_csv(os.path.join(output_dir, f"modified_Sequential_Play_{session}.csv"), index=False)
+    if write_excel:
+        schedule.to_excel(excel_file, index=False)
+
+    logging.info(f"Synthetic session {session} written to {output_dir}: {n_frames} frames, {len(schedule)} gestures")
+    return {"session": session, "daq_files": daq_files, "excel_file": excel_file, "ground_truth": schedule}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    generate_session("./Synthetic_files", 1, duration_s=60.0)
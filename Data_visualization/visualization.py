@@ -32,7 +32,7 @@ def visualize_sensor_data(sensor_data, database_name, fs_mmg=256, fs_imu=64):
 
         plt.tight_layout()
         plt.savefig(f'./visual/{database_name}_MMG_sensors.png', dpi=300)
-        plt.clf()  # Clear the figure for the next plot
+        plt.close(fig)  # Release the figure for the next plot
 
         logging.info(f"MMG sensor data visualization saved for {database_name}")
 
@@ -54,7 +54,7 @@ def visualize_sensor_data(sensor_data, database_name, fs_mmg=256, fs_imu=64):
 
             plt.tight_layout()
             plt.savefig(f'./visual/{database_name}_IMU_sensors.png', dpi=300)
-            plt.clf()
+            plt.close(fig)
 
             logging.info(f"IMU sensor data visualization saved for {database_name}")
         else: